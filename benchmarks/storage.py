@@ -0,0 +1,57 @@
+"""
+Compare the cost of a `/tagadd`-like upsert committed to a SQLite file and to the in-memory primary with snapshots.
+
+Run with: python benchmarks/storage.py
+"""
+
+import os
+import tempfile
+import timeit
+from pathlib import Path
+
+os.environ.setdefault("TELEGRAM_TOKEN", "benchmark")
+
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from lmbatbot.database.models import Base, TagGroup
+from lmbatbot.snapshot import SnapshotStore
+
+ITERATIONS = 500
+CHANGE_THRESHOLD = 100
+
+
+def _measure(label: str, engine: Engine, store: SnapshotStore | None = None) -> None:
+    session_factory = sessionmaker(engine)
+    if store is not None:
+        event.listen(session_factory, "after_commit", store.after_commit)
+
+    counter = iter(range(ITERATIONS * 4))
+
+    def upsert() -> None:
+        insert_stmt = insert(TagGroup).values(chat_id=1, group_name=f"#group{next(counter)}", tags=["@a", "@b"])
+        with session_factory.begin() as s:
+            s.execute(insert_stmt.on_conflict_do_update(set_={TagGroup.tags: insert_stmt.excluded.tags}))
+
+    per_call = min(timeit.repeat(upsert, number=ITERATIONS, repeat=3)) / ITERATIONS
+    print(f"{label:<36} {per_call * 1e6:9.1f} us/commit")  # noqa: T201
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        direct_path = Path(tmp) / "direct.sqlite3"
+        direct_engine = create_engine(f"sqlite:///{direct_path}")
+        Base.metadata.create_all(direct_engine)
+        _measure("file, direct", direct_engine)
+
+        memory_path = Path(tmp) / "memory.sqlite3"
+        Base.metadata.create_all(create_engine(f"sqlite:///{memory_path}"))
+        store = SnapshotStore(str(memory_path), CHANGE_THRESHOLD)
+        memory_engine = create_engine("sqlite://", creator=store.connect, poolclass=StaticPool)
+        _measure(f"memory, snapshot every {CHANGE_THRESHOLD} changes", memory_engine, store)
+
+
+if __name__ == "__main__":
+    main()
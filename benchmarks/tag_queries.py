@@ -0,0 +1,84 @@
+"""
+Compare the per-call cost and allocations of the hot tag queries, on ORM entities and on Core statements.
+
+Run with: python benchmarks/tag_queries.py
+"""
+
+import os
+import timeit
+import tracemalloc
+from collections.abc import Callable
+from unittest.mock import patch
+
+os.environ.setdefault("TELEGRAM_TOKEN", "benchmark")
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from lmbatbot import tags
+from lmbatbot.database.models import Base, TagGroup
+
+ITERATIONS = 2000
+CHAT_ID = 1
+GROUPS = 50
+
+engine = create_engine("sqlite://")
+Base.metadata.create_all(engine)
+Session = sessionmaker(engine)
+
+
+def _orm_collect_tags_for_groups(chat_id: int, hashtags: list[str]) -> set[str]:
+    with Session() as s:
+        found_groups = s.scalars(
+            select(TagGroup).where(TagGroup.chat_id == chat_id).where(TagGroup.group_name.in_(hashtags)),
+        ).all()
+
+    tag_set: set[str] = set()
+    for group in found_groups:
+        tag_set.update(group.tags)
+    return tag_set
+
+
+def _orm_list_groups(chat_id: int) -> list[tuple[str, list[str]]]:
+    with Session() as s:
+        tag_groups = s.scalars(select(TagGroup).where(TagGroup.chat_id == chat_id)).all()
+    return [(group.group_name, group.tags) for group in tag_groups]
+
+
+def _core_list_groups(chat_id: int) -> list[tuple[str, list[str]]]:
+    with Session() as s:
+        return [tuple(row) for row in s.connection().execute(tags._LIST_GROUPS_STMT, {"chat_id": chat_id})]  # noqa: SLF001
+
+
+def _measure(label: str, func: Callable[[], object]) -> None:
+    func()
+    per_call = min(timeit.repeat(func, number=ITERATIONS, repeat=3)) / ITERATIONS
+
+    tracemalloc.start()
+    func()
+    tracemalloc.reset_peak()
+    current, _ = tracemalloc.get_traced_memory()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{label:<24} {per_call * 1e6:8.1f} us/call  {(peak - current) / 1024:7.1f} KiB allocated at peak")  # noqa: T201
+
+
+def main() -> None:
+    with Session.begin() as s:
+        s.add_all(
+            TagGroup(chat_id=CHAT_ID, group_name=f"#group{i}", tags=[f"@user{j}" for j in range(i, i + 10)])
+            for i in range(GROUPS)
+        )
+    hashtags = ["#group1", "#group2", "#group3"]
+
+    with patch("lmbatbot.tags.Session", Session):
+        _measure("collect tags: ORM", lambda: _orm_collect_tags_for_groups(CHAT_ID, hashtags))
+        _measure("collect tags: Core", lambda: tags._collect_tags_for_groups(CHAT_ID, hashtags))  # noqa: SLF001
+        _measure("list groups: ORM", lambda: _orm_list_groups(CHAT_ID))
+        _measure("list groups: Core", lambda: _core_list_groups(CHAT_ID))
+
+
+if __name__ == "__main__":
+    main()
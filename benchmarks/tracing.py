@@ -0,0 +1,62 @@
+"""
+Measure the per-update overhead of tracing.
+
+Simulates the processing of an update that records as many spans as a typical hashtag update (one handler, entity
+parsing, one query and two Bot API calls) with tracing disabled, enabled but not sampled, and sampled.
+
+Run with: python benchmarks/tracing.py
+"""
+
+import os
+import tempfile
+import timeit
+from pathlib import Path
+
+os.environ.setdefault("TELEGRAM_TOKEN", "benchmark")
+
+from lmbatbot import tracing
+
+ITERATIONS = 100_000
+
+
+def _process_update() -> None:
+    with tracing.trace_update(1), tracing.span("tags.hashtag_message_handler"):
+        with tracing.span("parse_entities"):
+            pass
+        with tracing.span("db"):
+            pass
+        with tracing.span("bot.sendMessage"):
+            pass
+        with tracing.span("bot.sendMessage"):
+            pass
+
+
+def _run(label: str, baseline: float | None = None) -> float:
+    per_call = min(timeit.repeat(_process_update, number=ITERATIONS, repeat=5)) / ITERATIONS
+    overhead = "" if baseline is None else f" (+{(per_call - baseline) * 1e6:.2f} us)"
+    print(f"{label:<24} {per_call * 1e6:8.2f} us/update{overhead}")  # noqa: T201
+    return per_call
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        export_path = Path(tmp) / "traces.jsonl"
+        common = {"slow_threshold_ms": 1000, "max_bytes": 10 * 1024 * 1024, "backup_count": 1}
+
+        tracing.setup_tracing(None, sample_rate=0, **common)
+        baseline = _run("disabled")
+
+        tracing.setup_tracing(export_path, sample_rate=0, **common)
+        _run("enabled, not sampled", baseline)
+
+        tracing.setup_tracing(export_path, sample_rate=0.01, **common)
+        _run("enabled, 1% sampled", baseline)
+
+        tracing.setup_tracing(export_path, sample_rate=1, **common)
+        _run("enabled, all sampled", baseline)
+
+        tracing.setup_tracing(None, sample_rate=0, **common)
+
+
+if __name__ == "__main__":
+    main()
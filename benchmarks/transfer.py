@@ -0,0 +1,44 @@
+"""
+Measure the time needed to import (and export) thousands of tag groups.
+
+Run with: python benchmarks/transfer.py [GROUPS]
+"""
+
+import io
+import os
+import sys
+import time
+from unittest.mock import patch
+
+os.environ.setdefault("TELEGRAM_TOKEN", "benchmark")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from lmbatbot.database.models import Base
+from lmbatbot.tag_index import TagIndex
+from lmbatbot.transfer import export_tag_groups, import_tag_groups, parse_csv
+
+
+def main() -> None:
+    groups = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    document = "group_name,tags\n" + "".join(f"#group{i},@user{i} @user{i + 1} @user{i + 2}\n" for i in range(groups))
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with patch("lmbatbot.transfer.Session", sessionmaker(engine)), patch("lmbatbot.transfer.tag_index", TagIndex()):
+        start = time.perf_counter()
+        imported = import_tag_groups(1, parse_csv(io.StringIO(document)))
+        import_time = time.perf_counter() - start
+
+        exported = io.BytesIO()
+        start = time.perf_counter()
+        export_tag_groups(1, "csv", exported)
+        export_time = time.perf_counter() - start
+
+    print(f"import of {imported} groups: {import_time * 1000:8.1f} ms")  # noqa: T201
+    print(f"export of {exported.tell()} bytes: {export_time * 1000:8.1f} ms")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
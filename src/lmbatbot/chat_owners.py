@@ -0,0 +1,23 @@
+"""
+Assignment of each group chat to a single hosted bot.
+
+Tag groups are shared by all the bots in a chat, so when several hosted bots are members of the same chat only the one
+owning it replies to hashtags and sends private mentions, and each member is notified once. A chat is owned by the first
+bot handling one of its messages, until that bot leaves the chat.
+"""
+
+
+class ChatOwners:
+    def __init__(self) -> None:
+        self._owners: dict[int, int] = {}
+
+    def claim(self, chat_id: int, bot_id: int) -> bool:
+        """Whether `bot_id` owns the chat, making it the owner if the chat has none yet."""
+        return self._owners.setdefault(chat_id, bot_id) == bot_id
+
+    def release(self, chat_id: int, bot_id: int) -> None:
+        if self._owners.get(chat_id) == bot_id:
+            del self._owners[chat_id]
+
+
+chat_owners = ChatOwners()
@@ -0,0 +1,161 @@
+"""
+Cleanup of the data of chats the bot is no longer part of.
+
+Tag groups and usage statistics of a chat are purged when the bot is removed from it, and re-keyed when a group is
+migrated to a supergroup with a new chat id. Space freed by the deletions is reclaimed by a periodic incremental vacuum.
+"""
+
+import logging
+import sqlite3
+
+from sqlalchemy import Engine, delete, literal, select, text, update
+from sqlalchemy.dialects.sqlite import insert
+from telegram import Bot, ChatMember, Update
+from telegram.error import TelegramError
+from telegram.ext import ChatMemberHandler, ContextTypes, MessageHandler, filters
+
+from lmbatbot.chat_owners import chat_owners
+from lmbatbot.database import Session
+from lmbatbot.database.models import TagGroup, TagUsage
+from lmbatbot.database.session import engine
+from lmbatbot.stats import usage_counters
+from lmbatbot.tag_index import tag_index
+from lmbatbot.utils import TypedBaseHandler
+
+logger = logging.getLogger(__name__)
+
+# SQLite `auto_vacuum` value of the INCREMENTAL mode
+_AUTO_VACUUM_INCREMENTAL = 2
+
+# Bots hosted by this process, which share the tag groups of a chat
+hosted_bots: list[Bot] = []
+
+
+def purge_chat(chat_id: int) -> int:
+    """Delete the tag groups and the usage statistics of a chat, returning the number of tag groups deleted."""
+    with Session.begin() as s:
+        deleted = s.scalars(delete(TagGroup).where(TagGroup.chat_id == chat_id).returning(TagGroup.group_name)).all()
+        s.execute(delete(TagUsage).where(TagUsage.chat_id == chat_id))
+
+    tag_index.remove_chat(chat_id)
+    usage_counters.move_chat(chat_id, None)
+    return len(deleted)
+
+
+def migrate_chat(old_chat_id: int, new_chat_id: int) -> int:
+    """Move the tag groups and the usage statistics of a chat to its new chat id, returning the tag groups moved."""
+    with Session.begin() as s:
+        # Groups already created in the new chat take precedence over the migrated ones with the same name
+        moved = s.scalars(
+            update(TagGroup)
+            .where(TagGroup.chat_id == old_chat_id)
+            .values(chat_id=new_chat_id)
+            .prefix_with("OR IGNORE")
+            .returning(TagGroup.group_name),
+        ).all()
+        s.execute(delete(TagGroup).where(TagGroup.chat_id == old_chat_id))
+
+        insert_stmt = insert(TagUsage).from_select(
+            [TagUsage.chat_id, TagUsage.group_name, TagUsage.day, TagUsage.count],
+            select(literal(new_chat_id), TagUsage.group_name, TagUsage.day, TagUsage.count).where(
+                TagUsage.chat_id == old_chat_id,
+            ),
+        )
+        s.execute(
+            insert_stmt.on_conflict_do_update(set_={TagUsage.count: TagUsage.count + insert_stmt.excluded.count}),
+        )
+        s.execute(delete(TagUsage).where(TagUsage.chat_id == old_chat_id))
+
+    tag_index.move_chat(old_chat_id, new_chat_id)
+    usage_counters.move_chat(old_chat_id, new_chat_id)
+    return len(moved)
+
+
+async def _hosted_elsewhere(chat_id: int, left_bot_id: int) -> bool:
+    """Whether another bot hosted by this process is still a member of the chat, and so still uses its tag groups."""
+    for bot in hosted_bots:
+        if bot.id == left_bot_id:
+            continue
+        try:
+            member = await bot.get_chat_member(chat_id, bot.id)
+        except TelegramError:
+            continue
+        if member.status not in {ChatMember.LEFT, ChatMember.BANNED}:
+            return True
+    return False
+
+
+async def my_chat_member_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    assert update.my_chat_member
+
+    chat_id = update.my_chat_member.chat.id
+    if update.my_chat_member.new_chat_member.status not in {ChatMember.LEFT, ChatMember.BANNED}:
+        return
+    chat_owners.release(chat_id, context.bot.id)
+    if await _hosted_elsewhere(chat_id, context.bot.id):
+        logger.info("Bot removed from chat `%s`, still used by another bot", chat_id)
+        return
+
+    deleted = purge_chat(chat_id)
+    logger.info("Bot removed from chat `%s`, purged %s tag groups", chat_id, deleted)
+
+
+async def migrate_handler(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
+    assert update.effective_message
+
+    # The migration is announced in both chats, it's handled once from the old one
+    if (new_chat_id := update.effective_message.migrate_to_chat_id) is None:
+        return
+
+    old_chat_id = update.effective_message.chat_id
+    moved = migrate_chat(old_chat_id, new_chat_id)
+    logger.info("Chat `%s` migrated to `%s`, moved %s tag groups", old_chat_id, new_chat_id, moved)
+
+
+def enable_incremental_vacuum(db_engine: Engine) -> None:
+    """
+    Switch a SQLite database to the INCREMENTAL auto-vacuum mode.
+
+    Changing the mode of an existing database only takes effect after a full VACUUM, which rewrites the whole database:
+    it's done once, at startup, so that the periodic job only runs the cheap incremental vacuum.
+    """
+    if db_engine.dialect.name != "sqlite":
+        return
+
+    with db_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.execute(text("PRAGMA auto_vacuum")).scalar_one() != _AUTO_VACUUM_INCREMENTAL:
+            logger.info("Enabling incremental vacuum on the database")
+            conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+            conn.execute(text("VACUUM"))
+
+
+def incremental_vacuum(db_engine: Engine) -> int:
+    """Return the free pages of a SQLite database to the file system, returning the number of bytes freed."""
+    if db_engine.dialect.name != "sqlite":
+        return 0
+
+    with db_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.execute(text("PRAGMA auto_vacuum")).scalar_one() != _AUTO_VACUUM_INCREMENTAL:
+            return 0
+
+        page_size = conn.execute(text("PRAGMA page_size")).scalar_one()
+        free_pages = conn.execute(text("PRAGMA freelist_count")).scalar_one()
+        # The pragma frees a single page per step, while `executescript` runs it to completion
+        driver_connection = conn.connection.driver_connection
+        assert isinstance(driver_connection, sqlite3.Connection)
+        driver_connection.executescript("PRAGMA incremental_vacuum")
+        freed_pages = free_pages - conn.execute(text("PRAGMA freelist_count")).scalar_one()
+
+    return freed_pages * page_size
+
+
+async def vacuum_job(_: ContextTypes.DEFAULT_TYPE) -> None:
+    freed = incremental_vacuum(engine)
+    logger.info("Incremental vacuum freed %s bytes", freed)
+
+
+def handlers() -> list[TypedBaseHandler]:
+    return [
+        ChatMemberHandler(my_chat_member_handler, ChatMemberHandler.MY_CHAT_MEMBER),
+        MessageHandler(filters.StatusUpdate.MIGRATE, migrate_handler),
+    ]
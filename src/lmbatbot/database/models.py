@@ -1,3 +1,6 @@
+from datetime import date
+
+from sqlalchemy import Index
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 from sqlalchemy.types import JSON
 
@@ -12,3 +15,38 @@ class TagGroup(Base):
     chat_id: Mapped[int] = mapped_column(primary_key=True)
     group_name: Mapped[str] = mapped_column(primary_key=True)
     tags: Mapped[list[str]] = mapped_column(JSON)
+
+
+class User(Base):
+    __tablename__ = "users"
+
+    user_id: Mapped[int] = mapped_column(primary_key=True)
+    username: Mapped[str | None] = mapped_column(index=True)
+    display_name: Mapped[str]
+
+
+class TagUsage(Base):
+    __tablename__ = "tag_usage"
+    __table_args__ = (Index("ix_tag_usage_chat_id_day", "chat_id", "day"),)
+
+    chat_id: Mapped[int] = mapped_column(primary_key=True)
+    group_name: Mapped[str] = mapped_column(primary_key=True)
+    day: Mapped[date] = mapped_column(primary_key=True)
+    count: Mapped[int]
+
+
+class DigestSubscriber(Base):
+    __tablename__ = "digest_subscribers"
+
+    user_id: Mapped[int] = mapped_column(primary_key=True)
+
+
+class PendingMention(Base):
+    __tablename__ = "pending_mentions"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    bot_id: Mapped[int]
+    user_id: Mapped[int]
+    chat_name: Mapped[str]
+    sender_name: Mapped[str]
+    link: Mapped[str | None]
@@ -1,8 +1,20 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, make_url
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
 from lmbatbot.settings import settings
+from lmbatbot.snapshot import SnapshotStore, StorageMode
+from lmbatbot.tracing import instrument_engine
 
-engine = create_engine(settings.DB_URL)
+snapshot_store: SnapshotStore | None = None
+if settings.DB_STORAGE_MODE == StorageMode.MEMORY:
+    snapshot_store = SnapshotStore(str(make_url(settings.DB_URL).database), settings.DB_SNAPSHOT_CHANGES)
+    # A single in-memory connection shared by every session, as each connection to `:memory:` is a separate database
+    engine = create_engine("sqlite://", creator=snapshot_store.connect, poolclass=StaticPool)
+else:
+    engine = create_engine(settings.DB_URL)
+instrument_engine(engine)
 
 Session = sessionmaker(engine)
+if snapshot_store is not None:
+    event.listen(Session, "after_commit", snapshot_store.after_commit)
@@ -0,0 +1,161 @@
+"""
+Private mention digests.
+
+Users who opt in with `/digest on` receive their private mention notifications as a single periodic message, instead
+of one message per mention. Pending mentions are kept in memory, written to the database at shutdown and loaded back
+at startup.
+"""
+
+import html
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+
+from sqlalchemy import delete, insert, select
+from telegram import Update, constants
+from telegram.error import TelegramError
+from telegram.ext import CommandHandler, ContextTypes, filters
+
+from lmbatbot.database import Session
+from lmbatbot.database.models import DigestSubscriber, PendingMention
+from lmbatbot.settings import settings
+from lmbatbot.utils import TypedBaseHandler
+
+logger = logging.getLogger(__name__)
+
+MAX_DIGEST_LINES = 50
+
+
+@dataclass(frozen=True, slots=True)
+class Mention:
+    chat_name: str
+    sender_name: str
+    link: str | None
+
+
+class MentionDigests:
+    def __init__(self) -> None:
+        self.subscribers: set[int] = set()
+        # Mentions are delivered by the bot that saw them, so they are kept per (bot_id, user_id)
+        self._pending: defaultdict[tuple[int, int], list[Mention]] = defaultdict(list)
+
+    def load(self) -> None:
+        """Load the subscribers and the mentions left pending by the last shutdown."""
+        with Session.begin() as s:
+            self.subscribers = set(s.scalars(select(DigestSubscriber.user_id)))
+            rows = s.execute(
+                select(
+                    PendingMention.bot_id,
+                    PendingMention.user_id,
+                    PendingMention.chat_name,
+                    PendingMention.sender_name,
+                    PendingMention.link,
+                ).order_by(PendingMention.id),
+            ).tuples()
+            for bot_id, user_id, chat_name, sender_name, link in rows:
+                self._pending[bot_id, user_id].append(Mention(chat_name, sender_name, link))
+            s.execute(delete(PendingMention))
+
+    def persist(self) -> None:
+        """Write the pending mentions to the database, to be loaded back at the next startup."""
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, defaultdict(list)
+        with Session.begin() as s:
+            s.execute(
+                insert(PendingMention),
+                [
+                    {
+                        "bot_id": bot_id,
+                        "user_id": user_id,
+                        "chat_name": mention.chat_name,
+                        "sender_name": mention.sender_name,
+                        "link": mention.link,
+                    }
+                    for (bot_id, user_id), mentions in pending.items()
+                    for mention in mentions
+                ],
+            )
+
+    def subscribe(self, user_id: int, *, enabled: bool) -> None:
+        with Session.begin() as s:
+            if enabled:
+                s.merge(DigestSubscriber(user_id=user_id))
+            else:
+                s.execute(delete(DigestSubscriber).where(DigestSubscriber.user_id == user_id))
+
+        if enabled:
+            self.subscribers.add(user_id)
+        else:
+            self.subscribers.discard(user_id)
+
+    def add(self, bot_id: int, user_id: int, mention: Mention) -> None:
+        self._pending[bot_id, user_id].append(mention)
+
+    def take(self, bot_id: int) -> dict[int, list[Mention]]:
+        """Remove and return the pending mentions to be delivered by `bot_id`, by user id."""
+        keys = [key for key in self._pending if key[0] == bot_id]
+        return {user_id: self._pending.pop((key_bot_id, user_id)) for key_bot_id, user_id in keys}
+
+
+mention_digests = MentionDigests()
+
+
+def render_digest(mentions: list[Mention]) -> str:
+    lines = [
+        f"• <b>{html.escape(m.chat_name)}</b> by {html.escape(m.sender_name)}"
+        + (f' (<a href="{html.escape(m.link)}">message</a>)' if m.link else "")
+        for m in mentions[:MAX_DIGEST_LINES]
+    ]
+    if len(mentions) > MAX_DIGEST_LINES:
+        lines.append(f"<i>... and {len(mentions) - MAX_DIGEST_LINES} more</i>")
+
+    return f"You got mentioned {len(mentions)} times:\n\n" + "\n".join(lines)
+
+
+async def deliver_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    for user_id, mentions in mention_digests.take(context.bot.id).items():
+        logger.info("Sending digest of %s mentions to `%s`", len(mentions), user_id)
+        try:
+            await context.bot.send_message(
+                user_id,
+                render_digest(mentions),
+                parse_mode=constants.ParseMode.HTML,
+                disable_web_page_preview=True,
+            )
+        except TelegramError as e:
+            logger.warning("Could not send digest to `%s`: %s", user_id, e)
+
+
+async def digest_command_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    assert update.effective_chat
+    assert update.effective_user
+
+    # Only the users receiving private mention notifications have mentions to collect in a digest
+    if all(user_id != update.effective_user.id for _, user_id in settings.GLOBAL_PVT_NOTIFICATION_USERS):
+        await update.effective_chat.send_message("Digest mode is unavailable, you don't receive private mentions.")
+        return
+
+    match context.args:
+        case ["on"]:
+            mention_digests.subscribe(update.effective_user.id, enabled=True)
+            text = "Mentions will be delivered as a periodic digest."
+        case ["off"]:
+            mention_digests.subscribe(update.effective_user.id, enabled=False)
+            text = "Mentions will be delivered immediately."
+        case _:
+            enabled = update.effective_user.id in mention_digests.subscribers
+            text = f"""\
+Digest mode is {"on" if enabled else "off"}.
+
+Use /digest on or /digest off to change it."""
+
+    await update.effective_chat.send_message(text)
+
+
+def handlers() -> list[TypedBaseHandler]:
+    return [CommandHandler("digest", digest_command_handler, filters=filters.ChatType.PRIVATE)]
+
+
+commands = (("digest", "Receive mentions as a periodic digest (on/off)"),)
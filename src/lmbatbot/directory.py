@@ -0,0 +1,189 @@
+"""
+Directory of the users seen by the bot, mapping user ids to their current username and display name.
+
+Observations are buffered in memory and periodically written to the `users` table in a single batched upsert, so
+keeping the directory up to date doesn't cost a write per message.
+"""
+
+import html
+import logging
+from collections import OrderedDict
+from collections.abc import Collection, Iterable
+from dataclasses import dataclass
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from telegram import MessageEntity, Update
+from telegram import User as TelegramUser
+from telegram.ext import ContextTypes, TypeHandler
+
+from lmbatbot.database import Session
+from lmbatbot.database.models import User
+from lmbatbot.utils import TypedBaseHandler
+
+logger = logging.getLogger(__name__)
+
+USER_ID_TAG_PREFIX = "tg://user?id="
+MAX_FLUSHED_USERS = 50_000
+
+
+def user_id_tag(user_id: int) -> str:
+    """Tag identifying a member of a tag group by user id instead of username."""
+    return f"{USER_ID_TAG_PREFIX}{user_id}"
+
+
+def parse_user_id_tag(tag: str) -> int | None:
+    if not tag.startswith(USER_ID_TAG_PREFIX):
+        return None
+    try:
+        return int(tag.removeprefix(USER_ID_TAG_PREFIX))
+    except ValueError:
+        return None
+
+
+@dataclass(frozen=True, slots=True)
+class ObservedUser:
+    user_id: int
+    username: str | None
+    display_name: str
+
+    @classmethod
+    def from_telegram(cls, user: TelegramUser) -> "ObservedUser":
+        username = user.username.lower() if user.username else None
+        return cls(user_id=user.id, username=username, display_name=user.full_name)
+
+
+class UserDirectory:
+    def __init__(self) -> None:
+        self._pending: dict[int, ObservedUser] = {}
+        # Last state written for each user, used to skip writes when nothing changed
+        self._flushed: OrderedDict[int, ObservedUser] = OrderedDict()
+
+    def observe(self, user: TelegramUser) -> None:
+        if user.is_bot:
+            return
+
+        observed = ObservedUser.from_telegram(user)
+        if self._flushed.get(observed.user_id) != observed:
+            self._pending[observed.user_id] = observed
+
+    def flush(self) -> int:
+        """Write all pending observations with a single batched upsert, returning the number of users written."""
+        if not self._pending:
+            return 0
+
+        insert_stmt = insert(User)
+        insert_stmt = insert_stmt.on_conflict_do_update(
+            set_={User.username: insert_stmt.excluded.username, User.display_name: insert_stmt.excluded.display_name},
+        )
+        with Session.begin() as s:
+            s.execute(
+                insert_stmt,
+                [
+                    {"user_id": u.user_id, "username": u.username, "display_name": u.display_name}
+                    for u in self._pending.values()
+                ],
+            )
+
+        # Cleared only once committed, so that the observations of a failed write are retried by the next flush
+        pending, self._pending = self._pending, {}
+        for observed in pending.values():
+            self._flushed[observed.user_id] = observed
+            self._flushed.move_to_end(observed.user_id)
+        while len(self._flushed) > MAX_FLUSHED_USERS:
+            self._flushed.popitem(last=False)
+
+        return len(pending)
+
+    def lookup(self, user_ids: Collection[int]) -> dict[int, ObservedUser]:
+        if not user_ids:
+            return {}
+
+        with Session() as s:
+            rows = s.execute(
+                select(User.user_id, User.username, User.display_name).where(User.user_id.in_(user_ids)),
+            ).tuples()
+            users = {user_id: ObservedUser(user_id, username, display_name) for user_id, username, display_name in rows}
+
+        users.update({user_id: self._pending[user_id] for user_id in user_ids if user_id in self._pending})
+        return users
+
+    def resolve_usernames(self, usernames: Collection[str]) -> dict[str, int]:
+        """Map each known username (without `@`, lowercase) to its user id."""
+        if not usernames:
+            return {}
+
+        with Session() as s:
+            rows = s.execute(select(User.username, User.user_id).where(User.username.in_(usernames))).tuples()
+            user_ids: dict[str, int] = {username: user_id for username, user_id in rows if username is not None}
+
+        user_ids.update(
+            {
+                u.username: u.user_id
+                for u in self._pending.values()
+                if u.username is not None and u.username in usernames
+            },
+        )
+        return user_ids
+
+
+user_directory = UserDirectory()
+
+
+def resolve_tags(tags: Iterable[str]) -> list[str]:
+    """Replace the `@username` tags of known users with their user id tag."""
+    tags = list(tags)
+    user_ids = user_directory.resolve_usernames({tag.removeprefix("@") for tag in tags if tag.startswith("@")})
+    return [user_id_tag(user_ids[tag[1:]]) if tag[1:] in user_ids else tag for tag in tags]
+
+
+def render_mentions(tags: Iterable[str]) -> list[str]:
+    """Render tags as HTML mentions, using the current username of users stored by id."""
+    tags = list(tags)
+    users = user_directory.lookup({user_id for tag in tags if (user_id := parse_user_id_tag(tag)) is not None})
+
+    mentions: list[str] = []
+    for tag in tags:
+        if (user_id := parse_user_id_tag(tag)) is None:
+            mentions.append(tag)
+        elif (user := users.get(user_id)) and user.username:
+            mentions.append(f"@{user.username}")
+        else:
+            display_name = html.escape(user.display_name if user else str(user_id))
+            mentions.append(f'<a href="{tag}">{display_name}</a>')
+    return mentions
+
+
+def render_names(tags: Iterable[str]) -> list[str]:
+    """Render tags as HTML-escaped plain names that don't notify anyone."""
+    tags = list(tags)
+    users = user_directory.lookup({user_id for tag in tags if (user_id := parse_user_id_tag(tag)) is not None})
+
+    names: list[str] = []
+    for tag in tags:
+        if (user_id := parse_user_id_tag(tag)) is None:
+            names.append(html.escape(tag.lstrip("@")))
+        elif user := users.get(user_id):
+            names.append(html.escape(user.username or user.display_name))
+        else:
+            names.append(str(user_id))
+    return names
+
+
+async def observe_users_handler(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
+    if update.effective_user:
+        user_directory.observe(update.effective_user)
+
+    if message := update.effective_message:
+        for entity in message.parse_entities([MessageEntity.TEXT_MENTION]):
+            if entity.user:
+                user_directory.observe(entity.user)
+
+
+async def flush_job(_: ContextTypes.DEFAULT_TYPE) -> None:
+    if flushed := user_directory.flush():
+        logger.info("Flushed %s users to the user directory", flushed)
+
+
+def handlers() -> list[TypedBaseHandler]:
+    return [TypeHandler(Update, observe_users_handler)]
@@ -1,3 +1,4 @@
+import functools
 import json
 import random
 from pathlib import Path
@@ -10,6 +11,7 @@ from lmbatbot.utils import TypedBaseHandler
 STATIC_PATH = Path("./data/static/")
 
 
+@functools.cache
 def get_sticker_ids() -> dict[str, list[str]]:
     stickers_file = STATIC_PATH / "stickers.json"
     with stickers_file.open() as content:
@@ -29,12 +31,17 @@ async def stickers(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
     await update.effective_chat.send_sticker(sticker_list[rn])
 
 
+@functools.cache
+def get_lt_content() -> str:
+    lt_content_file = STATIC_PATH / "lt_content.txt"
+    with lt_content_file.open() as file:
+        return file.read()
+
+
 async def lt(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
     assert update.effective_chat
 
-    lt_content_file = STATIC_PATH / "lt_content.txt"
-    with lt_content_file.open() as file:
-        await update.effective_chat.send_message(file.read())
+    await update.effective_chat.send_message(get_lt_content())
 
 
 def handlers() -> list[TypedBaseHandler]:
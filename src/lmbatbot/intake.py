@@ -0,0 +1,151 @@
+"""
+Bounded, prioritized intake of updates.
+
+`IntakeQueue` replaces the unbounded `Application.update_queue`: updates are handed to the handlers by priority, and
+once the queue is past its high-water mark, low priority updates are shed instead of piling up. When the queue is full
+the Updater waits before fetching more updates, leaving them on Telegram's servers.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+from collections import Counter
+from collections.abc import Callable, Collection
+from enum import IntEnum, StrEnum
+from typing import override
+
+from telegram import MessageEntity, Update
+from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+class SheddingPolicy(StrEnum):
+    DROP_NEW = "drop_new"
+    """Shed the incoming low priority update."""
+    DROP_OLDEST = "drop_oldest"
+    """Shed the oldest queued low priority update to make room for the incoming one."""
+
+
+def _command(update: Update) -> str | None:
+    message = update.effective_message
+    if message is None or not message.text or not message.text.startswith("/"):
+        return None
+    return message.text.split(maxsplit=1)[0].split("@")[0].lstrip("/").lower()
+
+
+def update_classifier(high_commands: Collection[str], low_commands: Collection[str]) -> Callable[[object], Priority]:
+    """Classify updates running `high_commands` or containing hashtags as high priority, `low_commands` as low."""
+
+    def classify(item: object) -> Priority:
+        if not isinstance(item, Update):
+            # Internal signals, such as the one stopping the Application, are processed after the pending updates
+            return Priority.LOW
+
+        command = _command(item)
+        if command in low_commands:
+            return Priority.LOW
+        if command in high_commands:
+            return Priority.HIGH
+        if (message := item.effective_message) and any(e.type == MessageEntity.HASHTAG for e in message.entities):
+            return Priority.HIGH
+        return Priority.NORMAL
+
+    return classify
+
+
+class IntakeQueue(asyncio.Queue[object]):
+    def __init__(
+        self,
+        classify: Callable[[object], Priority],
+        maxsize: int,
+        high_water: int,
+        policy: SheddingPolicy = SheddingPolicy.DROP_NEW,
+    ) -> None:
+        super().__init__(maxsize)
+        self.classify = classify
+        self.high_water = high_water
+        self.policy = policy
+        self.dropped: Counter[Priority] = Counter()
+        self._sequence = itertools.count()
+
+    # Items are stored as (priority, sequence, item) in a heap, as `asyncio.PriorityQueue` does
+    @override
+    def _init(self, maxsize: int) -> None:
+        self._queue: list[tuple[Priority, int, object]] = []
+
+    @override
+    def _put(self, item: object) -> None:
+        heapq.heappush(self._queue, (self.classify(item), next(self._sequence), item))
+
+    @override
+    def _get(self) -> object:
+        return heapq.heappop(self._queue)[2]
+
+    def _shed_oldest(self, priority: Priority) -> bool:
+        candidates = [entry for entry in self._queue if entry[0] == priority and isinstance(entry[2], Update)]
+        if not candidates:
+            return False
+
+        self._queue.remove(min(candidates, key=lambda entry: entry[1]))
+        heapq.heapify(self._queue)
+        self.dropped[priority] += 1
+        self.task_done()
+        return True
+
+    def _sheddable(self, item: object) -> bool:
+        """Whether `item` is a low priority update arriving while the queue is past its high-water mark."""
+        return self.qsize() >= self.high_water and isinstance(item, Update) and self.classify(item) == Priority.LOW
+
+    def _put_or_shed(self, item: object) -> None:
+        if self.policy == SheddingPolicy.DROP_OLDEST and self._shed_oldest(Priority.LOW):
+            super().put_nowait(item)
+        else:
+            self.dropped[Priority.LOW] += 1
+
+    @override
+    async def put(self, item: object) -> None:
+        # The shedding decision is taken before waiting for a free slot, so that the Updater is never stalled by an
+        # update that is going to be dropped anyway
+        if self._sheddable(item):
+            self._put_or_shed(item)
+            return
+
+        # Updates more important than LOW take the place of a queued LOW one instead of waiting
+        if self.full() and self.classify(item) < Priority.LOW:
+            self._shed_oldest(Priority.LOW)
+        await super().put(item)
+
+    @override
+    def put_nowait(self, item: object) -> None:
+        if self._sheddable(item):
+            self._put_or_shed(item)
+            return
+        super().put_nowait(item)
+
+
+async def report_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Log the depth of the update queue and the updates dropped since the last report, if overloaded."""
+    assert context.job
+    queue = context.application.update_queue
+    if not isinstance(queue, IntakeQueue):
+        return
+
+    assert isinstance(context.job.data, Counter)
+    reported: Counter[Priority] = context.job.data
+    dropped = queue.dropped - reported
+    if dropped or queue.qsize() >= queue.high_water:
+        logger.warning(
+            "Update queue depth: %s/%s, dropped updates since last report: %s",
+            queue.qsize(),
+            queue.maxsize,
+            {priority.name: count for priority, count in sorted(dropped.items())},
+        )
+    reported.update(dropped)
@@ -1,17 +1,29 @@
+import asyncio
 import logging
+import signal
+from collections import Counter
+from collections.abc import Callable, Iterable
 
 from telegram import Update
-from telegram.ext import Application
+from telegram.ext import Application, CommandHandler
 
-from lmbatbot import fun, tags
+from lmbatbot import cleanup, digest, directory, fun, intake, snapshot, stats, tags, transfer
+from lmbatbot.database.session import engine, snapshot_store
 from lmbatbot.settings import settings
-from lmbatbot.utils import version_command_handler
+from lmbatbot.tag_index import load_tag_index
+from lmbatbot.tracing import TracedApplication, TracedRequest, instrument_handlers, setup_tracing
+from lmbatbot.utils import TypedBaseHandler, version_command_handler
+
+logger = logging.getLogger(__name__)
 
 
 async def _set_commands(app: Application) -> None:
     await app.bot.set_my_commands(
         (
             *tags.commands,
+            *transfer.commands,
+            *stats.commands,
+            *digest.commands,
             ("bocchi", "Bocchi"),
             ("lt", "REEEEEEEEEEEEETI"),
             ("version", "Display bot version"),
@@ -19,14 +31,122 @@ async def _set_commands(app: Application) -> None:
     )
 
 
+def _schedule_shared_jobs(app: Application) -> None:
+    """Schedule the jobs working on state shared by all the bots, on the job queue of a single one."""
+    assert app.job_queue
+    app.job_queue.run_repeating(directory.flush_job, interval=settings.USER_DIRECTORY_FLUSH_INTERVAL)
+    app.job_queue.run_repeating(stats.flush_job, interval=settings.TAG_USAGE_FLUSH_INTERVAL)
+    app.job_queue.run_repeating(cleanup.vacuum_job, interval=settings.VACUUM_INTERVAL)
+    if snapshot_store is not None:
+        app.job_queue.run_repeating(snapshot.persist_job, interval=settings.DB_SNAPSHOT_INTERVAL, data=snapshot_store)
+
+
+def _flush(name: str, flush: Callable[[], object]) -> None:
+    try:
+        flush()
+    except Exception:
+        logger.exception("Failed to flush the %s at shutdown", name)
+
+
+def _flush_shared_state() -> None:
+    """Flush the write-behind state to the database, a failing flush doesn't prevent the others."""
+    try:
+        _flush("user directory", directory.user_directory.flush)
+        _flush("tag usage counters", stats.usage_counters.flush)
+        _flush("mention digests", digest.mention_digests.persist)
+    finally:
+        # Last, to include the writes of the flushes above
+        if snapshot_store is not None:
+            snapshot_store.persist()
+
+
+def _command_names(handlers: Iterable[TypedBaseHandler]) -> set[str]:
+    return {command for handler in handlers if isinstance(handler, CommandHandler) for command in handler.commands}
+
+
+def _build_application(token: str) -> Application:
+    tag_handlers = [*tags.handlers(), *transfer.handlers(), *stats.handlers(), *digest.handlers()]
+    fun_handlers = fun.handlers()
+    update_queue = intake.IntakeQueue(
+        intake.update_classifier(high_commands=_command_names(tag_handlers), low_commands=_command_names(fun_handlers)),
+        maxsize=settings.INTAKE_MAX_SIZE,
+        high_water=settings.INTAKE_HIGH_WATER,
+        policy=settings.INTAKE_SHEDDING_POLICY,
+    )
+
+    application = (
+        Application.builder()
+        .application_class(TracedApplication)
+        .token(token)
+        .request(TracedRequest())
+        .update_queue(update_queue)
+        .build()
+    )
+
+    application.add_handlers(instrument_handlers(directory.handlers()), group=-2)
+    application.add_handlers(instrument_handlers(tags.tracking_handlers()), group=-1)
+    application.add_handlers(instrument_handlers(tag_handlers))
+    application.add_handlers(instrument_handlers(cleanup.handlers()))
+    application.add_handlers(instrument_handlers(fun_handlers))
+    application.add_handlers(instrument_handlers([version_command_handler()]))
+
+    assert application.job_queue
+    application.job_queue.run_repeating(intake.report_job, interval=settings.INTAKE_REPORT_INTERVAL, data=Counter())
+    application.job_queue.run_repeating(digest.deliver_job, interval=settings.MENTION_DIGEST_INTERVAL)
+
+    return application
+
+
+async def _run(tokens: Iterable[str]) -> None:
+    """
+    Run one `Application` per token in the current event loop until SIGINT or SIGTERM is received.
+
+    All the applications share the database engine, the static content and the in-memory caches; each one has its own
+    update queue and job queue.
+    """
+    stop_signal = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_signal.set)
+
+    applications = [_build_application(token) for token in tokens]
+    cleanup.hosted_bots.extend(application.bot for application in applications)
+    running: list[Application] = []
+    load_tag_index()
+    digest.mention_digests.load()
+    cleanup.enable_incremental_vacuum(engine)
+    try:
+        for application in applications:
+            await application.initialize()
+            running.append(application)
+            await _set_commands(application)
+            await application.start()
+            assert application.updater
+            await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+            logger.info("Bot `%s` started", application.bot.username)
+
+        _schedule_shared_jobs(applications[0])
+        await stop_signal.wait()
+    finally:
+        for application in reversed(running):
+            if application.updater and application.updater.running:
+                await application.updater.stop()
+            if application.running:
+                await application.stop()
+            await application.shutdown()
+        _flush_shared_state()
+
+
 def main() -> None:
     logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
     logging.getLogger("httpx").setLevel(logging.WARNING)
 
-    application = Application.builder().token(settings.TELEGRAM_TOKEN).post_init(_set_commands).build()
-
-    application.add_handlers(tags.handlers())
-    application.add_handlers(fun.handlers())
-    application.add_handler(version_command_handler())
+    setup_tracing(
+        settings.TRACE_EXPORT_PATH,
+        sample_rate=settings.TRACE_SAMPLE_RATE,
+        slow_threshold_ms=settings.TRACE_SLOW_THRESHOLD_MS,
+        max_bytes=settings.TRACE_EXPORT_MAX_BYTES,
+        backup_count=settings.TRACE_EXPORT_BACKUP_COUNT,
+    )
 
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    asyncio.run(_run([settings.TELEGRAM_TOKEN, *settings.ADDITIONAL_TELEGRAM_TOKENS]))
@@ -0,0 +1,71 @@
+"""
+Log of the notifications already sent for each message, so that edits only notify what they add.
+
+Entries expire after a TTL and the log holds a bounded number of messages, evicting the oldest ones first, so its memory
+use stays flat however many messages are edited. An edit of a message no longer in the log notifies everything again.
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from lmbatbot.settings import settings
+
+# (bot_id, chat_id, message_id), as every bot in a chat sends its own notifications
+type MessageKey = tuple[int, int, int]
+
+
+@dataclass(frozen=True, slots=True)
+class Notified:
+    group_names: frozenset[str] = frozenset()
+    """Groups whose usage was counted."""
+    tags: frozenset[str] = frozenset()
+    """Members tagged in the reply."""
+    mentions: frozenset[str] = frozenset()
+    """Tags and mentions considered for private notifications."""
+
+    def __or__(self, other: "Notified") -> "Notified":
+        return Notified(
+            self.group_names | other.group_names,
+            self.tags | other.tags,
+            self.mentions | other.mentions,
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self.group_names or self.tags or self.mentions)
+
+
+class NotificationLog:
+    def __init__(self, ttl: float, max_messages: int) -> None:
+        self.ttl = ttl
+        self.max_messages = max_messages
+        # Ordered by expiration, since every entry gets the same TTL when it's recorded
+        self._entries: OrderedDict[MessageKey, tuple[float, Notified]] = OrderedDict()
+
+    def _expire(self, now: float) -> None:
+        while self._entries and next(iter(self._entries.values()))[0] <= now:
+            self._entries.popitem(last=False)
+
+    def get(self, key: MessageKey) -> Notified:
+        self._expire(time.monotonic())
+        entry = self._entries.get(key)
+        return entry[1] if entry else Notified()
+
+    def record(self, key: MessageKey, notified: Notified) -> None:
+        """Add `notified` to the notifications of the message, renewing its TTL."""
+        now = time.monotonic()
+        self._expire(now)
+        if not notified:
+            return
+
+        if key in self._entries:
+            notified |= self._entries.pop(key)[1]
+        self._entries[key] = (now + self.ttl, notified)
+        while len(self._entries) > self.max_messages:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+notification_log = NotificationLog(settings.EDIT_TRACKING_TTL, settings.EDIT_TRACKING_MAX_MESSAGES)
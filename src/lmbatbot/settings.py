@@ -1,13 +1,64 @@
-from pydantic import Field
+from pathlib import Path
+from typing import Self
+
+from pydantic import Field, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy import make_url
+
+from lmbatbot.intake import SheddingPolicy
+from lmbatbot.snapshot import StorageMode
 
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env")
 
     TELEGRAM_TOKEN: str = Field(default=...)
+    # Tokens of further bots to run in the same process, sharing the database and the caches
+    ADDITIONAL_TELEGRAM_TOKENS: list[str] = Field(default=[])
     DB_URL: str = Field(default="sqlite://")
+    # In the memory mode, changes are persisted to the `DB_URL` file every DB_SNAPSHOT_INTERVAL seconds or as soon as
+    # DB_SNAPSHOT_CHANGES rows changed, whichever comes first
+    DB_STORAGE_MODE: StorageMode = Field(default=StorageMode.DIRECT)
+    DB_SNAPSHOT_INTERVAL: float = Field(default=60, gt=0)
+    DB_SNAPSHOT_CHANGES: int = Field(default=100, gt=0)
     GLOBAL_PVT_NOTIFICATION_USERS: list[tuple[str, int]] = Field(default=[])
 
+    USER_DIRECTORY_FLUSH_INTERVAL: float = Field(default=60, gt=0)
+    TAG_USAGE_FLUSH_INTERVAL: float = Field(default=60, gt=0)
+    MENTION_DIGEST_INTERVAL: float = Field(default=60 * 60, gt=0)
+    VACUUM_INTERVAL: float = Field(default=24 * 60 * 60, gt=0)
+
+    # Notifications sent for each message are remembered for EDIT_TRACKING_TTL seconds, so that edits notify only what
+    # they add
+    EDIT_TRACKING_TTL: float = Field(default=48 * 60 * 60, gt=0)
+    EDIT_TRACKING_MAX_MESSAGES: int = Field(default=10_000, gt=0)
+
+    INTAKE_MAX_SIZE: int = Field(default=1000, gt=0)
+    INTAKE_HIGH_WATER: int = Field(default=200, gt=0)
+    INTAKE_SHEDDING_POLICY: SheddingPolicy = Field(default=SheddingPolicy.DROP_NEW)
+    INTAKE_REPORT_INTERVAL: float = Field(default=60, gt=0)
+
+    TRACE_EXPORT_PATH: Path | None = Field(default=None)
+    TRACE_EXPORT_MAX_BYTES: int = Field(default=10 * 1024 * 1024)
+    TRACE_EXPORT_BACKUP_COUNT: int = Field(default=3)
+    TRACE_SAMPLE_RATE: float = Field(default=0.01, ge=0, le=1)
+    TRACE_SLOW_THRESHOLD_MS: float = Field(default=1000)
+
+    @model_validator(mode="after")
+    def _check_intake(self) -> Self:
+        if self.INTAKE_HIGH_WATER > self.INTAKE_MAX_SIZE:
+            msg = "INTAKE_HIGH_WATER must not be greater than INTAKE_MAX_SIZE"
+            raise ValueError(msg)
+        return self
+
+    @model_validator(mode="after")
+    def _check_storage_mode(self) -> Self:
+        if self.DB_STORAGE_MODE == StorageMode.MEMORY:
+            url = make_url(self.DB_URL)
+            if url.get_backend_name() != "sqlite" or url.database in {None, "", ":memory:"}:
+                msg = "DB_STORAGE_MODE=memory requires DB_URL to point to a SQLite database file"
+                raise ValueError(msg)
+        return self
+
 
 settings = Settings()
@@ -0,0 +1,74 @@
+"""
+In-memory SQLite primary database, persisted with periodic snapshots.
+
+In the `memory` storage mode all queries are served by an in-memory copy of the SQLite database file, loaded at
+startup. The copy is written back to the file with SQLite's online backup API once enough changes accumulate, on a timer
+and at shutdown, so commits don't pay for disk syncs. Changes made since the last snapshot are lost on a crash.
+"""
+
+import logging
+import sqlite3
+from contextlib import closing
+from enum import StrEnum
+
+from sqlalchemy.orm import Session
+from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+
+class StorageMode(StrEnum):
+    DIRECT = "direct"
+    """Queries go straight to the database at `DB_URL`."""
+    MEMORY = "memory"
+    """Queries are served by an in-memory copy of the SQLite database file at `DB_URL`, persisted with snapshots."""
+
+
+class SnapshotStore:
+    def __init__(self, path: str, change_threshold: int) -> None:
+        self.path = path
+        self.change_threshold = change_threshold
+        self._connection: sqlite3.Connection | None = None
+        self._persisted_changes = 0
+
+    def connect(self) -> sqlite3.Connection:
+        """Create the in-memory database with the content of the file, to be used as the `creator` of the engine."""
+        connection = sqlite3.connect(":memory:", check_same_thread=False)
+        with closing(sqlite3.connect(self.path)) as source:
+            source.backup(connection)
+
+        logger.info("Loaded database `%s` in memory", self.path)
+        self._connection = connection
+        self._persisted_changes = connection.total_changes
+        return connection
+
+    @property
+    def pending_changes(self) -> int:
+        """Rows changed since the last snapshot."""
+        if self._connection is None:
+            return 0
+        return self._connection.total_changes - self._persisted_changes
+
+    def persist(self) -> bool:
+        """Write the in-memory database to the file if it changed, returning whether it did."""
+        if self._connection is None or not self.pending_changes:
+            return False
+
+        changes = self._connection.total_changes
+        with closing(sqlite3.connect(self.path)) as target:
+            self._connection.backup(target)
+
+        logger.info("Persisted %s changes to `%s`", changes - self._persisted_changes, self.path)
+        self._persisted_changes = changes
+        return True
+
+    def after_commit(self, _: Session) -> None:
+        """Session `after_commit` listener, persisting once the pending changes reach the threshold."""
+        if self.pending_changes >= self.change_threshold:
+            self.persist()
+
+
+async def persist_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    assert context.job
+    assert isinstance(context.job.data, SnapshotStore)
+    context.job.data.persist()
@@ -0,0 +1,131 @@
+"""
+Usage statistics of the tag groups.
+
+Triggers are counted in memory per chat, group and day, and periodically added to the `tag_usage` table in a single
+batched upsert, so counting doesn't add a write to every hashtag message.
+"""
+
+import logging
+from collections import Counter
+from collections.abc import Iterable
+from datetime import date, timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+from telegram import Update, constants
+from telegram.ext import CommandHandler, ContextTypes
+
+from lmbatbot.database import Session
+from lmbatbot.database.models import TagUsage
+from lmbatbot.tag_index import tag_index
+from lmbatbot.utils import TypedBaseHandler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATS_DAYS = 30
+MAX_STATS_DAYS = 3650
+
+
+class UsageCounters:
+    def __init__(self) -> None:
+        self._pending: Counter[tuple[int, str, date]] = Counter()
+
+    def record(self, chat_id: int, group_names: Iterable[str]) -> None:
+        today = date.today()
+        for group_name in group_names:
+            self._pending[chat_id, group_name, today] += 1
+
+    def pending(self, chat_id: int, since: date) -> Counter[str]:
+        return Counter(
+            {
+                group_name: count
+                for (pending_chat_id, group_name, day), count in self._pending.items()
+                if pending_chat_id == chat_id and day >= since
+            },
+        )
+
+    def move_chat(self, old_chat_id: int, new_chat_id: int | None) -> None:
+        """Re-key the pending counters of `old_chat_id` to `new_chat_id`, or discard them if it's `None`."""
+        for chat_id, group_name, day in list(self._pending):
+            if chat_id != old_chat_id:
+                continue
+            count = self._pending.pop((chat_id, group_name, day))
+            if new_chat_id is not None:
+                self._pending[new_chat_id, group_name, day] += count
+
+    def flush(self) -> int:
+        """Add the pending counters to the aggregates with a single batched upsert, returning the rows written."""
+        if not self._pending:
+            return 0
+
+        insert_stmt = insert(TagUsage)
+        insert_stmt = insert_stmt.on_conflict_do_update(
+            set_={TagUsage.count: TagUsage.count + insert_stmt.excluded.count},
+        )
+        with Session.begin() as s:
+            s.execute(
+                insert_stmt,
+                [
+                    {"chat_id": chat_id, "group_name": group_name, "day": day, "count": count}
+                    for (chat_id, group_name, day), count in self._pending.items()
+                ],
+            )
+
+        # Cleared only once committed, so that the counters of a failed write are retried by the next flush
+        flushed = len(self._pending)
+        self._pending = Counter()
+        return flushed
+
+
+usage_counters = UsageCounters()
+
+
+def _usage_since(chat_id: int, since: date) -> Counter[str]:
+    with Session() as s:
+        rows = (
+            s.execute(
+                select(TagUsage.group_name, func.sum(TagUsage.count))
+                .where(TagUsage.chat_id == chat_id, TagUsage.day >= since)
+                .group_by(TagUsage.group_name),
+            )
+            .tuples()
+            .all()
+        )
+        usage = Counter(dict(rows))
+
+    usage.update(usage_counters.pending(chat_id, since))
+    return usage
+
+
+async def tagstats_command_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    assert update.effective_chat
+
+    chat_id = update.effective_chat.id
+    days = DEFAULT_STATS_DAYS
+    if context.args and context.args[0].isdecimal():
+        days = min(max(int(context.args[0]), 1), MAX_STATS_DAYS)
+    usage = _usage_since(chat_id, date.today() - timedelta(days=days - 1))
+
+    used = [
+        f"{group_name}: {count}" for group_name, count in usage.most_common() if tag_index.contains(chat_id, group_name)
+    ]
+    unused = [group_name for group_name in tag_index.group_names(chat_id) if group_name not in usage]
+
+    message = f"<b>Group usage in the last {days} days:</b>\n\n"
+    message += "\n".join(used) if used else "<i>No group has been used.</i>"
+    if unused:
+        message += f"\n\n<b>Unused groups:</b> {', '.join(unused)}"
+
+    await update.effective_chat.send_message(message, parse_mode=constants.ParseMode.HTML)
+
+
+async def flush_job(_: ContextTypes.DEFAULT_TYPE) -> None:
+    if flushed := usage_counters.flush():
+        logger.info("Flushed %s tag usage counters", flushed)
+
+
+def handlers() -> list[TypedBaseHandler]:
+    return [CommandHandler("tagstats", tagstats_command_handler)]
+
+
+commands = (("tagstats", "Shows how often each tag group is used"),)
@@ -0,0 +1,115 @@
+import bisect
+from collections import OrderedDict
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+from sqlalchemy import select
+
+from lmbatbot.database import Session
+from lmbatbot.database.models import TagGroup
+
+MAX_RECENT_CHATS = 10_000
+
+
+@dataclass
+class ChatTagIndex:
+    """Group names of a single chat, kept sorted to answer prefix searches with `bisect`."""
+
+    names: list[str] = field(default_factory=list)
+    member_counts: dict[str, int] = field(default_factory=dict)
+
+    def upsert(self, group_name: str, member_count: int) -> None:
+        if group_name not in self.member_counts:
+            bisect.insort(self.names, group_name)
+        self.member_counts[group_name] = member_count
+
+    def remove(self, group_name: str) -> None:
+        if self.member_counts.pop(group_name, None) is None:
+            return
+        del self.names[bisect.bisect_left(self.names, group_name)]
+
+    def search(self, prefix: str, limit: int) -> list[tuple[str, int]]:
+        results: list[tuple[str, int]] = []
+        for name in self.names[bisect.bisect_left(self.names, prefix) :]:
+            if len(results) == limit or not name.startswith(prefix):
+                break
+            results.append((name, self.member_counts[name]))
+        return results
+
+
+def normalize_prefix(prefix: str) -> str:
+    return f"#{prefix.strip().lstrip('#').lower()}"
+
+
+class TagIndex:
+    """
+    In-memory prefix index of the tag groups of every chat.
+
+    It mirrors the `tag_groups` table, so it must be updated by every command that changes it. Inline queries don't
+    carry the chat they are typed in, so the index also remembers the last group chat where each user wrote, separately
+    for each bot since inline queries are sent to a specific bot.
+    """
+
+    def __init__(self) -> None:
+        self._chats: dict[int, ChatTagIndex] = {}
+        self._recent_chats: OrderedDict[tuple[int, int], int] = OrderedDict()
+
+    def load(self, rows: Iterable[tuple[int, str, list[str]]]) -> None:
+        self._chats.clear()
+        for chat_id, group_name, tags in rows:
+            self.upsert(chat_id, group_name, len(tags))
+
+    def upsert(self, chat_id: int, group_name: str, member_count: int) -> None:
+        self._chats.setdefault(chat_id, ChatTagIndex()).upsert(group_name, member_count)
+
+    def remove(self, chat_id: int, group_names: Iterable[str]) -> None:
+        if (chat_index := self._chats.get(chat_id)) is None:
+            return
+        for group_name in group_names:
+            chat_index.remove(group_name)
+        if not chat_index.names:
+            del self._chats[chat_id]
+
+    def remove_chat(self, chat_id: int) -> None:
+        self._chats.pop(chat_id, None)
+
+    def move_chat(self, old_chat_id: int, new_chat_id: int) -> None:
+        """Re-key the groups and the recent chats of `old_chat_id`, as when a group is migrated to a supergroup."""
+        if (chat_index := self._chats.pop(old_chat_id, None)) is not None:
+            for group_name in chat_index.names:
+                if not self.contains(new_chat_id, group_name):
+                    self.upsert(new_chat_id, group_name, chat_index.member_counts[group_name])
+
+        for key, chat_id in self._recent_chats.items():
+            if chat_id == old_chat_id:
+                self._recent_chats[key] = new_chat_id
+
+    def contains(self, chat_id: int, group_name: str) -> bool:
+        return (chat_index := self._chats.get(chat_id)) is not None and group_name in chat_index.member_counts
+
+    def group_names(self, chat_id: int) -> list[str]:
+        if (chat_index := self._chats.get(chat_id)) is None:
+            return []
+        return list(chat_index.names)
+
+    def search(self, chat_id: int, prefix: str, limit: int = 50) -> list[tuple[str, int]]:
+        if (chat_index := self._chats.get(chat_id)) is None:
+            return []
+        return chat_index.search(normalize_prefix(prefix), limit)
+
+    def remember_chat(self, bot_id: int, user_id: int, chat_id: int) -> None:
+        self._recent_chats[bot_id, user_id] = chat_id
+        self._recent_chats.move_to_end((bot_id, user_id))
+        if len(self._recent_chats) > MAX_RECENT_CHATS:
+            self._recent_chats.popitem(last=False)
+
+    def recent_chat(self, bot_id: int, user_id: int) -> int | None:
+        return self._recent_chats.get((bot_id, user_id))
+
+
+tag_index = TagIndex()
+
+
+def load_tag_index() -> None:
+    with Session() as s:
+        tag_index.load(s.execute(select(TagGroup.chat_id, TagGroup.group_name, TagGroup.tags)).tuples())
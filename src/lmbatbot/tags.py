@@ -1,21 +1,50 @@
-import contextlib
+import itertools
 import logging
 from dataclasses import dataclass
+from uuid import uuid4
 
-from sqlalchemy import delete, func, select
+from sqlalchemy import bindparam, delete, func, select
 from sqlalchemy.dialects.sqlite import insert
-from telegram import Message, MessageEntity, Update, constants
-from telegram.ext import CommandHandler, ContextTypes, MessageHandler, filters
+from telegram import (
+    Chat,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
+    Message,
+    MessageEntity,
+    Update,
+    User,
+    constants,
+)
+from telegram.ext import CommandHandler, ContextTypes, InlineQueryHandler, MessageHandler, filters
 
+from lmbatbot.chat_owners import chat_owners
 from lmbatbot.database import Session
 from lmbatbot.database.models import TagGroup
 from lmbatbot.database.types import UpsertResult
+from lmbatbot.digest import Mention, mention_digests
+from lmbatbot.directory import render_mentions, render_names, resolve_tags, user_id_tag
+from lmbatbot.notification_log import Notified, notification_log
 from lmbatbot.settings import settings
+from lmbatbot.stats import usage_counters
+from lmbatbot.tag_index import tag_index
+from lmbatbot.tracing import span
 from lmbatbot.utils import CommandParsingError, TypedBaseHandler
 
 logger = logging.getLogger(__name__)
 
 
+# The read hot paths use Core statements built once, returning plain rows instead of ORM instances. The compiled form
+# of each statement is cached by SQLAlchemy, so executing them skips both compilation and the ORM loading machinery.
+_LIST_GROUPS_STMT = select(TagGroup.group_name, TagGroup.tags).where(TagGroup.chat_id == bindparam("chat_id"))
+_COLLECT_TAGS_STMT = select(TagGroup.tags).where(
+    TagGroup.chat_id == bindparam("chat_id"),
+    TagGroup.group_name.in_(bindparam("group_names", expanding=True)),
+)
+
+_HASHTAGS = filters.Entity(MessageEntity.HASHTAG)
+_MENTIONS = filters.Entity(MessageEntity.MENTION) | filters.Entity(MessageEntity.TEXT_MENTION)
+
+
 @dataclass
 class TagAddArgs:
     group: str
@@ -27,25 +56,22 @@ def _parse_tagadd_command(effective_message: Message) -> TagAddArgs:
     Command must contain the following arguments in any order.
 
     /tagadd <#group> <@mentions...>
+
+    Users mentioned without username (TEXT_MENTION) are stored by user id.
     """
     hashtags = effective_message.parse_entities([MessageEntity.HASHTAG]).values()
     if len(hashtags) != 1:
         msg = f"Invalid number of tag groups. Need: 1, Got: {len(hashtags)}"
         raise CommandParsingError(msg)
 
-    # TODO: add support for TEXT_MENTION
-    # https://github.com/ardubev16/lmbatbot/issues/18
-    text_mentions = effective_message.parse_entities([MessageEntity.TEXT_MENTION])
-    if len(text_mentions) > 0:
-        msg = f"TEXT_MENTION are not supported yet, these users cannot be added: {list(text_mentions.values())}"
-        raise CommandParsingError(msg)
-
     mentions = effective_message.parse_entities([MessageEntity.MENTION]).values()
-    if len(mentions) == 0:
+    text_mentions = effective_message.parse_entities([MessageEntity.TEXT_MENTION])
+    if len(mentions) + len(text_mentions) == 0:
         msg = "No mentions found"
         raise CommandParsingError(msg)
 
     deuped_mentions = set(map(str.lower, mentions))
+    deuped_mentions.update(user_id_tag(entity.user.id) for entity in text_mentions if entity.user)
     return TagAddArgs(group=next(iter(hashtags)).lower(), tags=list(deuped_mentions))
 
 
@@ -70,18 +96,37 @@ def _upsert_tag_group(chat_id: int, tag_group: TagAddArgs) -> UpsertResult:
     return UpsertResult.UPDATED if row_exists else UpsertResult.INSERTED
 
 
+def _exclude_user(tags: set[str], user: User) -> None:
+    """Remove the tags that refer to `user`, both by username and by user id."""
+    tags.discard(user_id_tag(user.id))
+    if user.username:
+        tags.discard(f"@{user.username.lower()}")
+
+
+def _parse_mentions(message: Message) -> set[str]:
+    mentions = set(map(str.lower, message.parse_entities([MessageEntity.MENTION]).values()))
+    mentions.update(
+        user_id_tag(entity.user.id) for entity in message.parse_entities([MessageEntity.TEXT_MENTION]) if entity.user
+    )
+    return mentions
+
+
 async def _send_private_mentions(message: Message, mentioned_usernames: set[str]) -> None:
     assert message.from_user
 
     text = f"You got mentioned in <b>{message.chat.effective_name}</b> by {message.from_user.name}."
-    if username := message.from_user.username:
-        with contextlib.suppress(KeyError):
-            mentioned_usernames.remove(f"@{username.lower()}")
+    _exclude_user(mentioned_usernames, message.from_user)
 
     # TODO: temporary implementation, create a table ad-hoc
     # https://github.com/ardubev16/lmbatbot/issues/12
     for username, user_id in settings.GLOBAL_PVT_NOTIFICATION_USERS:
-        if username.lower() in mentioned_usernames:
+        if username.lower() not in mentioned_usernames and user_id_tag(user_id) not in mentioned_usernames:
+            continue
+
+        if user_id in mention_digests.subscribers:
+            mention = Mention(message.chat.effective_name or "", message.from_user.name, message.link)
+            mention_digests.add(message.get_bot().id, user_id, mention)
+        else:
             logger.info("Sending private message to `%s`", user_id)
             await message.reply_html(text, do_quote=message.build_reply_arguments(target_chat_id=user_id))
 
@@ -90,9 +135,11 @@ async def taglist_command_handler(update: Update, _: ContextTypes.DEFAULT_TYPE)
     assert update.effective_chat
 
     with Session() as s:
-        tag_groups = s.scalars(select(TagGroup).where(TagGroup.chat_id == update.effective_chat.id)).all()
+        tag_groups = s.connection().execute(_LIST_GROUPS_STMT, {"chat_id": update.effective_chat.id}).all()
 
-    string_group = [f"{group.group_name}: {', '.join(name.lstrip('@') for name in group.tags)}" for group in tag_groups]
+    # Render the names of all groups at once, so that the user directory is queried only once
+    names = iter(render_names(tag for _, tags in tag_groups for tag in tags))
+    string_group = [f"{group_name}: {', '.join(itertools.islice(names, len(tags)))}" for group_name, tags in tag_groups]
     if len(string_group) != 0:
         message = f"""\
 <b>Groups:</b>
@@ -124,7 +171,9 @@ Please use the following format:
         await update.effective_message.reply_text(text)
         return
 
+    tag_group.tags = resolve_tags(tag_group.tags)
     res = _upsert_tag_group(chat_id, tag_group)
+    tag_index.upsert(chat_id, tag_group.group, len(tag_group.tags))
 
     match res:
         case UpsertResult.UPDATED:
@@ -158,53 +207,107 @@ Invalid format. Please use the following format:
             .returning(TagGroup.group_name),
         ).all()
 
+    tag_index.remove(chat_id, deleted_groups)
     logger.info("User `%s` deleted tag groups %s in chat `%s`", update.effective_user.id, deleted_groups, chat_id)
 
     message = f"The following groups have been removed: {', '.join(deleted_groups)}"
     await update.effective_chat.send_message(message)
 
 
-async def mention_message_handler(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
-    assert update.effective_message
-    assert update.effective_message.from_user
+async def tagfind_command_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    assert update.effective_chat
+
+    prefix = context.args[0] if context.args else ""
+    matches = tag_index.search(update.effective_chat.id, prefix)
+
+    if matches:
+        message = "\n".join(f"{group_name} ({member_count} members)" for group_name, member_count in matches)
+    else:
+        message = "No groups found."
+
+    await update.effective_chat.send_message(message)
+
 
-    mentions = set(map(str.lower, update.effective_message.parse_entities([MessageEntity.MENTION]).values()))
-    await _send_private_mentions(update.effective_message, mentions)
+async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    assert update.inline_query
+
+    inline_query = update.inline_query
+    chat_id = tag_index.recent_chat(context.bot.id, inline_query.from_user.id)
+    matches = tag_index.search(chat_id, inline_query.query) if chat_id is not None else []
+
+    results = [
+        InlineQueryResultArticle(
+            id=str(uuid4()),
+            title=group_name,
+            description=f"{member_count} members",
+            input_message_content=InputTextMessageContent(group_name),
+        )
+        for group_name, member_count in matches
+    ]
+    await inline_query.answer(results, cache_time=10, is_personal=True)
+
+
+async def remember_chat_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    assert update.effective_chat
+    assert update.effective_user
+
+    tag_index.remember_chat(context.bot.id, update.effective_user.id, update.effective_chat.id)
 
 
 def _collect_tags_for_groups(chat_id: int, hashtags: list[str]) -> set[str]:
     with Session() as s:
-        found_groups = s.scalars(
-            select(TagGroup).where(TagGroup.chat_id == chat_id).where(TagGroup.group_name.in_(hashtags)),
-        ).all()
+        found_tags = s.connection().execute(_COLLECT_TAGS_STMT, {"chat_id": chat_id, "group_names": hashtags}).scalars()
 
-    tag_set: set[str] = set()
-    for group in found_groups:
-        tag_set.update(group.tags)
+        tag_set: set[str] = set()
+        for tags in found_tags:
+            tag_set.update(tags)
     return tag_set
 
 
-async def hashtag_message_handler(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
+async def _notify(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Tag the members of the groups and notify the mentioned users, skipping those already notified for the message."""
     assert update.effective_chat
     assert update.effective_message
     assert update.effective_user
 
-    tags = list(map(str.lower, update.effective_message.parse_entities([MessageEntity.HASHTAG]).values()))
-    mentions = list(map(str.lower, update.effective_message.parse_entities([MessageEntity.MENTION]).values()))
+    chat_id = update.effective_chat.id
+    # Each bot has its own private chat with a user, even though they share the same chat id
+    if update.effective_chat.type != Chat.PRIVATE and not chat_owners.claim(chat_id, context.bot.id):
+        return
 
-    tag_set = _collect_tags_for_groups(update.effective_chat.id, tags)
+    key = (context.bot.id, chat_id, update.effective_message.message_id)
+    notified = notification_log.get(key)
 
-    if not tag_set:
-        return
+    with span("parse_entities"):
+        hashtags = set(map(str.lower, update.effective_message.parse_entities([MessageEntity.HASHTAG]).values()))
+        hashtags -= notified.group_names
+        mentions = _parse_mentions(update.effective_message)
 
-    if username := update.effective_user.username:
-        with contextlib.suppress(KeyError):
-            tag_set.remove(f"@{username.lower()}")
+    tag_set = _collect_tags_for_groups(chat_id, list(hashtags)) if hashtags else set()
+    group_names = {tag for tag in hashtags if tag_index.contains(chat_id, tag)}
+    usage_counters.record(chat_id, group_names)
 
-    if tag_set:
-        await update.effective_message.reply_html(" ".join(tag_set))
+    _exclude_user(tag_set, update.effective_user)
 
-    await _send_private_mentions(update.effective_message, tag_set.union(mentions))
+    if new_tags := tag_set - notified.tags:
+        await update.effective_message.reply_html(" ".join(render_mentions(new_tags)))
+
+    await _send_private_mentions(update.effective_message, (tag_set | mentions) - notified.mentions)
+
+    notification_log.record(key, Notified(frozenset(group_names), frozenset(tag_set), frozenset(tag_set | mentions)))
+
+
+async def hashtag_message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await _notify(update, context)
+
+
+async def mention_message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await _notify(update, context)
+
+
+async def edited_message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Notify only the groups and the users added by the edit."""
+    await _notify(update, context)
 
 
 def handlers() -> list[TypedBaseHandler]:
@@ -212,8 +315,17 @@ def handlers() -> list[TypedBaseHandler]:
         CommandHandler("taglist", taglist_command_handler),
         CommandHandler("tagadd", tagadd_command_handler),
         CommandHandler("tagdel", tagdel_command_handler),
-        MessageHandler(filters.Entity(constants.MessageEntityType.HASHTAG), hashtag_message_handler),
-        MessageHandler(filters.Entity(constants.MessageEntityType.MENTION), mention_message_handler),
+        CommandHandler("tagfind", tagfind_command_handler),
+        InlineQueryHandler(inline_query_handler),
+        MessageHandler(filters.UpdateType.MESSAGE & _HASHTAGS, hashtag_message_handler),
+        MessageHandler(filters.UpdateType.MESSAGE & _MENTIONS, mention_message_handler),
+        MessageHandler(filters.UpdateType.EDITED_MESSAGE & (_HASHTAGS | _MENTIONS), edited_message_handler),
+    ]
+
+
+def tracking_handlers() -> list[TypedBaseHandler]:
+    return [
+        MessageHandler(filters.ChatType.GROUPS & filters.USER, remember_chat_handler),
     ]
 
 
@@ -221,4 +333,5 @@ commands = (
     ("taglist", "Lists available tags"),
     ("tagadd", "Adds a tag group"),
     ("tagdel", "Deletes a tag group"),
+    ("tagfind", "Finds tag groups by prefix"),
 )
@@ -0,0 +1,208 @@
+"""
+Sampled, span-based tracing of update processing.
+
+Every update processed by a :class:`TracedApplication` opens a trace. Handlers, database statements and outbound Bot
+API calls executed while processing it record spans into that trace. When the update is done, the trace is exported as
+a single JSON line if it was sampled (see ``TRACE_SAMPLE_RATE``) or if it took longer than ``TRACE_SLOW_THRESHOLD_MS``.
+
+Spans are plain tuples appended to a list, so recording them is cheap enough to stay enabled in production; the cost
+is measured by ``benchmarks/tracing.py``.
+"""
+
+import functools
+import json
+import logging
+import random
+import time
+from collections.abc import Callable, Coroutine, Generator, Iterable
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, override
+
+from sqlalchemy import Engine, event
+from telegram import Update
+from telegram.ext import Application
+from telegram.request import HTTPXRequest
+
+from lmbatbot.utils import TypedBaseHandler
+
+logger = logging.getLogger(__name__)
+
+_exporter = logging.getLogger(f"{__name__}.export")
+_exporter.propagate = False
+
+
+@dataclass(slots=True)
+class Trace:
+    update_id: int | None
+    sampled: bool
+    start_time: float = field(default_factory=time.time)
+    start_ns: int = field(default_factory=time.perf_counter_ns)
+    spans: list[tuple[str, int, int, dict[str, Any]]] = field(default_factory=list)
+
+    def to_json(self, duration_ns: int) -> str:
+        return json.dumps(
+            {
+                "update_id": self.update_id,
+                "start": self.start_time,
+                "duration_ms": duration_ns / 1e6,
+                "sampled": self.sampled,
+                "spans": [
+                    {"name": name, "offset_ms": offset / 1e6, "duration_ms": duration / 1e6, **attributes}
+                    for name, offset, duration, attributes in self.spans
+                ],
+            },
+            default=str,
+        )
+
+
+@dataclass(slots=True)
+class TracingConfig:
+    enabled: bool = False
+    sample_rate: float = 0.0
+    slow_threshold_ns: int = 0
+
+
+_config = TracingConfig()
+_current_trace: ContextVar[Trace | None] = ContextVar("current_trace", default=None)
+
+
+def setup_tracing(
+    export_path: Path | None,
+    *,
+    sample_rate: float,
+    slow_threshold_ms: float,
+    max_bytes: int,
+    backup_count: int,
+) -> None:
+    """Enable tracing, exporting traces to a rotating JSONL file at `export_path`. Tracing is disabled if it's None."""
+    for handler in _exporter.handlers[:]:
+        _exporter.removeHandler(handler)
+        handler.close()
+
+    if export_path is None:
+        _config.enabled = False
+        return
+
+    export_path.parent.mkdir(parents=True, exist_ok=True)
+    file_handler = RotatingFileHandler(export_path, maxBytes=max_bytes, backupCount=backup_count)
+    file_handler.setFormatter(logging.Formatter("%(message)s"))
+    _exporter.addHandler(file_handler)
+    _exporter.setLevel(logging.INFO)
+
+    _config.enabled = True
+    _config.sample_rate = sample_rate
+    _config.slow_threshold_ns = int(slow_threshold_ms * 1e6)
+    logger.info("Tracing enabled, sample rate %s, exporting to `%s`", sample_rate, export_path)
+
+
+@contextmanager
+def trace_update(update_id: int | None) -> Generator[Trace | None]:
+    """Trace everything executed in this context as the processing of a single update."""
+    if not _config.enabled:
+        yield None
+        return
+
+    trace = Trace(update_id=update_id, sampled=random.random() < _config.sample_rate)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        duration_ns = time.perf_counter_ns() - trace.start_ns
+        if trace.sampled or duration_ns >= _config.slow_threshold_ns:
+            _exporter.info(trace.to_json(duration_ns))
+
+
+def record_span(name: str, start_ns: int, attributes: dict[str, Any] | None = None) -> None:
+    """Record a span started at `start_ns` (from `time.perf_counter_ns`) and ending now."""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+
+    end_ns = time.perf_counter_ns()
+    trace.spans.append((name, start_ns - trace.start_ns, end_ns - start_ns, attributes or {}))
+
+
+class _Span:
+    __slots__ = ("attributes", "name", "start_ns")
+
+    def __init__(self, name: str, attributes: dict[str, Any]) -> None:
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = 0
+
+    def __enter__(self) -> None:
+        self.start_ns = time.perf_counter_ns()
+
+    def __exit__(self, *_: object) -> None:
+        record_span(self.name, self.start_ns, self.attributes)
+
+
+_NO_SPAN = nullcontext()
+
+
+def span(name: str, **attributes: Any) -> AbstractContextManager[None]:  # noqa: ANN401
+    """Record the execution of the context as a span named `name`, if a trace is active."""
+    if _current_trace.get() is None:
+        return _NO_SPAN
+    return _Span(name, attributes)
+
+
+def traced[**P, R](func: Callable[P, Coroutine[Any, Any, R]]) -> Callable[P, Coroutine[Any, Any, R]]:
+    """Record a span for every call of the async function `func`."""
+    # Callables in general, such as `functools.partial` objects, have no `__qualname__`
+    qualname = getattr(func, "__qualname__", type(func).__qualname__)
+    name = f"{func.__module__.removeprefix('lmbatbot.')}.{qualname}"
+
+    @functools.wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        with span(name):
+            return await func(*args, **kwargs)
+
+    return wrapper
+
+
+def instrument_handlers(handlers: Iterable[TypedBaseHandler]) -> list[TypedBaseHandler]:
+    """Wrap the callback of each handler so that it records a span."""
+    handlers = list(handlers)
+    for handler in handlers:
+        handler.callback = traced(handler.callback)
+    return handlers
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Record a span for every statement executed on `engine`."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(_conn, _cursor, _statement, _parameters, context, _executemany) -> None:  # noqa: ANN001
+        if context is not None and _current_trace.get() is not None:
+            context.trace_start_ns = time.perf_counter_ns()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(_conn, _cursor, statement, _parameters, context, executemany) -> None:  # noqa: ANN001
+        if (start_ns := getattr(context, "trace_start_ns", None)) is not None:
+            record_span("db", start_ns, {"statement": statement, "executemany": executemany})
+
+
+class TracedRequest(HTTPXRequest):
+    """`HTTPXRequest` recording a span for every Bot API call made while processing an update."""
+
+    # The timeouts are forwarded untouched, so their types, private to PTB, don't need to be spelled out
+    @override
+    async def do_request(self, url: str, method: str, *args: Any, **kwargs: Any) -> tuple[int, bytes]:
+        with span(f"bot.{url.rsplit('/', 1)[-1]}"):
+            return await super().do_request(url, method, *args, **kwargs)
+
+
+class TracedApplication(Application):
+    """`Application` opening a new trace for every update it processes."""
+
+    @override
+    async def process_update(self, update: object) -> None:
+        update_id = update.update_id if isinstance(update, Update) else None
+        with trace_update(update_id):
+            await super().process_update(update)
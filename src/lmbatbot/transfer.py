@@ -0,0 +1,265 @@
+"""Bulk export and import of the tag groups of a chat as CSV or JSON documents."""
+
+import csv
+import io
+import json
+import logging
+import re
+import tempfile
+from collections.abc import Iterable, Iterator
+from itertools import batched
+from typing import IO, Any
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from telegram import Document, Update
+from telegram.ext import CommandHandler, ContextTypes, MessageHandler, filters
+
+from lmbatbot.database import Session
+from lmbatbot.database.models import TagGroup
+from lmbatbot.directory import USER_ID_TAG_PREFIX
+from lmbatbot.tag_index import tag_index
+from lmbatbot.tags import TagAddArgs
+from lmbatbot.utils import CommandParsingError, TypedBaseHandler
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 1000
+# Documents are downloaded in memory by PTB, so their size is bounded; this is also the Bot API download limit
+MAX_IMPORT_SIZE = 20 * 1024 * 1024
+# Exports larger than this are spooled to a temporary file
+EXPORT_SPOOL_SIZE = 1024 * 1024
+JSON_CHUNK_SIZE = 64 * 1024
+CSV_HEADER = ("group_name", "tags")
+
+# Imported names end up in HTML messages, so they must match what Telegram itself would parse as an entity
+_GROUP_NAME_RE = re.compile(r"#\w+")
+_TAG_RE = re.compile(rf"@[A-Za-z0-9_]{{4,32}}|{re.escape(USER_ID_TAG_PREFIX)}[0-9]+")
+
+
+def _valid_tag(tag: str) -> bool:
+    return _TAG_RE.fullmatch(tag) is not None
+
+
+def _valid_tag_group(group_name: object, tags: object) -> TagAddArgs:
+    if not isinstance(group_name, str) or not _GROUP_NAME_RE.fullmatch(group_name):
+        msg = f"Invalid group name: {group_name!r}"
+        raise CommandParsingError(msg)
+    if not isinstance(tags, list) or not tags or not all(isinstance(t, str) and _valid_tag(t) for t in tags):
+        msg = f"Invalid tags for group {group_name}: {tags!r}"
+        raise CommandParsingError(msg)
+
+    deduped_tags = set(map(str.lower, tags))
+    return TagAddArgs(group=group_name.lower(), tags=sorted(deduped_tags))
+
+
+def parse_csv(stream: IO[str]) -> Iterator[TagAddArgs]:
+    """Parse rows of `group_name,tags` where tags are separated by spaces."""
+    reader = csv.reader(stream)
+    for line_number, row in enumerate(reader, start=1):
+        if line_number == 1 and tuple(row) == CSV_HEADER:
+            continue
+        if len(row) != len(CSV_HEADER):
+            msg = f"Line {line_number}: expected {len(CSV_HEADER)} columns, got {len(row)}"
+            raise CommandParsingError(msg)
+        yield _valid_tag_group(row[0], row[1].split())
+
+
+class _JsonListReader:
+    """Decoder of the items of a top-level JSON list, one at a time, reading the stream in chunks."""
+
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, stream: IO[str]) -> None:
+        self._stream = stream
+        self._buffer = ""
+        self._pos = 0
+
+    def _read(self) -> bool:
+        """Append a chunk of the stream to the unconsumed part of the buffer, returning False at the end."""
+        if not (chunk := self._stream.read(JSON_CHUNK_SIZE)):
+            return False
+        self._buffer, self._pos = self._buffer[self._pos :] + chunk, 0
+        return True
+
+    def _next_char(self) -> str:
+        """Skip the whitespace and return the next character without consuming it, or "" at the end."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in " \t\n\r":
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read():
+                return ""
+
+    def _expect(self, chars: str, description: str) -> str:
+        if (char := self._next_char()) == "" or char not in chars:
+            msg = f"Expected {description}, got {char or 'the end of the document'!r}"
+            raise CommandParsingError(msg)
+        self._pos += 1
+        return char
+
+    def _decode(self) -> Any:  # noqa: ANN401
+        # A complete item is always followed by `,` or `]`, so an item reaching the end of the buffer may be truncated
+        while True:
+            try:
+                item, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._read():
+                    raise
+                continue
+            if end < len(self._buffer) or not self._read():
+                self._pos = end
+                return item
+
+    def __iter__(self) -> Iterator[Any]:
+        self._expect("[", "a JSON list of groups")
+        if self._next_char() == "]":
+            self._pos += 1
+        else:
+            while True:
+                self._next_char()
+                yield self._decode()
+                if self._expect(",]", "`,` or `]` after a group") == "]":
+                    break
+
+        if self._next_char() != "":
+            msg = "Unexpected data after the JSON list"
+            raise CommandParsingError(msg)
+
+
+def parse_json(stream: IO[str]) -> Iterator[TagAddArgs]:
+    """Parse a list of `{"group_name": ..., "tags": [...]}` objects, one at a time."""
+    for item in _JsonListReader(stream):
+        if not isinstance(item, dict):
+            msg = f"Invalid group: {item!r}"
+            raise CommandParsingError(msg)
+        yield _valid_tag_group(item.get("group_name"), item.get("tags"))
+
+
+def import_tag_groups(chat_id: int, tag_groups: Iterable[TagAddArgs]) -> int:
+    """Upsert all `tag_groups` in a single transaction, with one batched statement per `IMPORT_BATCH_SIZE` groups."""
+    insert_stmt = insert(TagGroup)
+    insert_stmt = insert_stmt.on_conflict_do_update(set_={TagGroup.tags: insert_stmt.excluded.tags})
+
+    imported: list[TagAddArgs] = []
+    with Session.begin() as s:
+        for batch in batched(tag_groups, IMPORT_BATCH_SIZE):
+            s.execute(
+                insert_stmt,
+                [{"chat_id": chat_id, "group_name": group.group, "tags": group.tags} for group in batch],
+            )
+            imported.extend(batch)
+
+    for group in imported:
+        tag_index.upsert(chat_id, group.group, len(group.tags))
+    return len(imported)
+
+
+def export_tag_groups(chat_id: int, fmt: str, out: IO[bytes]) -> None:
+    """Stream the tag groups of the chat from the database into `out`, as a CSV or JSON document."""
+    buffer = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+    with Session() as s:
+        rows = s.execute(
+            select(TagGroup.group_name, TagGroup.tags)
+            .where(TagGroup.chat_id == chat_id)
+            .order_by(TagGroup.group_name)
+            .execution_options(yield_per=IMPORT_BATCH_SIZE),
+        ).tuples()
+
+        if fmt == "json":
+            buffer.write("[")
+            for i, (group_name, tags) in enumerate(rows):
+                buffer.write(("," if i else "") + json.dumps({"group_name": group_name, "tags": tags}))
+            buffer.write("]")
+        else:
+            writer = csv.writer(buffer)
+            writer.writerow(CSV_HEADER)
+            writer.writerows((group_name, " ".join(tags)) for group_name, tags in rows)
+
+    # Leave `out` open for the caller
+    buffer.detach()
+
+
+async def tagexport_command_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    assert update.effective_chat
+
+    fmt = "json" if context.args and context.args[0].lower() == "json" else "csv"
+    with tempfile.SpooledTemporaryFile(EXPORT_SPOOL_SIZE) as document:
+        export_tag_groups(update.effective_chat.id, fmt, document)
+        document.seek(0)
+        await update.effective_chat.send_document(document, filename=f"tag_groups_{update.effective_chat.id}.{fmt}")
+
+
+def _import_document(update: Update) -> Document | None:
+    assert update.effective_message
+
+    if document := update.effective_message.document:
+        return document
+    if reply_to := update.effective_message.reply_to_message:
+        return reply_to.document
+    return None
+
+
+async def tagimport_command_handler(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
+    assert update.effective_chat
+    assert update.effective_message
+    assert update.effective_user
+
+    chat_id = update.effective_chat.id
+
+    document = _import_document(update)
+    if document is None:
+        text = """\
+No document found. Please send a CSV or JSON document with /tagimport as caption, or reply to one with /tagimport."""
+        await update.effective_message.reply_text(text)
+        return
+
+    if document.file_size is not None and document.file_size > MAX_IMPORT_SIZE:
+        text = f"The document is too large, the limit is {MAX_IMPORT_SIZE // (1024 * 1024)} MB."
+        await update.effective_message.reply_text(text)
+        return
+
+    content = await (await document.get_file()).download_as_bytearray()
+    is_json = (document.file_name or "").lower().endswith(".json") or document.mime_type == "application/json"
+    stream = io.TextIOWrapper(io.BytesIO(content), encoding="utf-8-sig", newline="")
+
+    try:
+        imported = import_tag_groups(chat_id, parse_json(stream) if is_json else parse_csv(stream))
+    except (CommandParsingError, UnicodeDecodeError, json.JSONDecodeError, csv.Error) as e:
+        await update.effective_message.reply_text(f"Import failed, no group has been changed: {e}")
+        return
+
+    logger.info("User `%s` imported %s tag groups in chat `%s`", update.effective_user.id, imported, chat_id)
+    await update.effective_chat.send_message(f"{imported} groups imported!")
+
+
+async def tagimport_caption_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    assert context.matches
+
+    # Like commands, a caption addressed to another bot in the chat is not for this one
+    bot_username = context.matches[0].group("bot_username")
+    if bot_username is not None and bot_username.lower() != context.bot.username.lower():
+        return
+
+    await tagimport_command_handler(update, context)
+
+
+def handlers() -> list[TypedBaseHandler]:
+    return [
+        CommandHandler("tagexport", tagexport_command_handler),
+        CommandHandler("tagimport", tagimport_command_handler),
+        # Only new messages, editing the caption of an imported document must not import it again
+        MessageHandler(
+            filters.UpdateType.MESSAGE
+            & filters.Document.ALL
+            & filters.CaptionRegex(r"^/tagimport(?:@(?P<bot_username>\w+))?\b"),
+            tagimport_caption_handler,
+        ),
+    ]
+
+
+commands = (
+    ("tagexport", "Exports the tag groups as a CSV (or JSON) document"),
+    ("tagimport", "Imports tag groups from a CSV or JSON document"),
+)
@@ -0,0 +1,170 @@
+from datetime import date
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sqlalchemy import create_engine, delete
+from sqlalchemy.orm import sessionmaker
+from telegram import ChatMember
+
+from lmbatbot.chat_owners import ChatOwners
+from lmbatbot.cleanup import (
+    enable_incremental_vacuum,
+    incremental_vacuum,
+    migrate_chat,
+    migrate_handler,
+    my_chat_member_handler,
+    purge_chat,
+)
+from lmbatbot.database.models import Base, TagGroup, TagUsage
+from lmbatbot.stats import UsageCounters
+from lmbatbot.tag_index import TagIndex
+
+OLD_CHAT_ID = -100
+NEW_CHAT_ID = -1001
+
+
+def _populate(session_factory: sessionmaker) -> None:
+    with session_factory.begin() as s:
+        s.add(TagGroup(chat_id=OLD_CHAT_ID, group_name="#team", tags=["@a", "@b"]))
+        s.add(TagGroup(chat_id=OLD_CHAT_ID, group_name="#ops", tags=["@c"]))
+        s.add(TagGroup(chat_id=1, group_name="#team", tags=["@d"]))
+        s.add(TagUsage(chat_id=OLD_CHAT_ID, group_name="#team", day=date(2026, 1, 1), count=3))
+        s.add(TagUsage(chat_id=NEW_CHAT_ID, group_name="#team", day=date(2026, 1, 1), count=2))
+
+
+def _tag_groups(session_factory: sessionmaker) -> set[tuple[int, str]]:
+    with session_factory() as s:
+        return {(g.chat_id, g.group_name) for g in s.query(TagGroup)}
+
+
+# ---------------------------------------------------------------------------
+# purge_chat and migrate_chat
+# ---------------------------------------------------------------------------
+
+
+class TestChatCleanup:
+    def test_purge_chat(self, session_factory: sessionmaker):
+        _populate(session_factory)
+        index = TagIndex()
+        index.upsert(OLD_CHAT_ID, "#team", 2)
+        counters = UsageCounters()
+        counters.record(OLD_CHAT_ID, ["#team"])
+        with (
+            patch("lmbatbot.cleanup.Session", session_factory),
+            patch("lmbatbot.cleanup.tag_index", index),
+            patch("lmbatbot.cleanup.usage_counters", counters),
+        ):
+            assert purge_chat(OLD_CHAT_ID) == 2  # noqa: PLR2004
+
+        assert _tag_groups(session_factory) == {(1, "#team")}
+        with session_factory() as s:
+            assert {u.chat_id for u in s.query(TagUsage)} == {NEW_CHAT_ID}
+        assert not index.contains(OLD_CHAT_ID, "#team")
+        assert not counters.pending(OLD_CHAT_ID, date.min)
+
+    def test_migrate_chat(self, session_factory: sessionmaker):
+        _populate(session_factory)
+        with session_factory.begin() as s:
+            s.add(TagGroup(chat_id=NEW_CHAT_ID, group_name="#ops", tags=["@new"]))
+        index = TagIndex()
+        index.upsert(OLD_CHAT_ID, "#team", 2)
+        index.remember_chat(1, 200, OLD_CHAT_ID)
+        counters = UsageCounters()
+        counters.record(OLD_CHAT_ID, ["#team"])
+        with (
+            patch("lmbatbot.cleanup.Session", session_factory),
+            patch("lmbatbot.cleanup.tag_index", index),
+            patch("lmbatbot.cleanup.usage_counters", counters),
+        ):
+            assert migrate_chat(OLD_CHAT_ID, NEW_CHAT_ID) == 1
+
+        assert _tag_groups(session_factory) == {(1, "#team"), (NEW_CHAT_ID, "#team"), (NEW_CHAT_ID, "#ops")}
+        with session_factory() as s:
+            assert s.get(TagGroup, (NEW_CHAT_ID, "#ops")).tags == ["@new"]
+            assert [(u.chat_id, u.count) for u in s.query(TagUsage)] == [(NEW_CHAT_ID, 5)]
+        assert index.contains(NEW_CHAT_ID, "#team")
+        assert index.recent_chat(1, 200) == NEW_CHAT_ID
+        assert counters.pending(NEW_CHAT_ID, date.min) == {"#team": 1}
+
+
+# ---------------------------------------------------------------------------
+# Handlers
+# ---------------------------------------------------------------------------
+
+
+class TestHandlers:
+    def _member_update(self, status: str) -> MagicMock:
+        update = MagicMock()
+        update.my_chat_member.chat.id = OLD_CHAT_ID
+        update.my_chat_member.new_chat_member.status = status
+        return update
+
+    async def test_purges_when_removed(self):
+        with patch("lmbatbot.cleanup.purge_chat", return_value=0) as purge:
+            await my_chat_member_handler(self._member_update(ChatMember.LEFT), MagicMock())
+        purge.assert_called_once_with(OLD_CHAT_ID)
+
+    async def test_releases_the_chat_ownership(self):
+        owners = ChatOwners()
+        owners.claim(OLD_CHAT_ID, 1)
+        context = MagicMock()
+        context.bot.id = 1
+        with patch("lmbatbot.cleanup.chat_owners", owners), patch("lmbatbot.cleanup.purge_chat", return_value=0):
+            await my_chat_member_handler(self._member_update(ChatMember.LEFT), context)
+        assert owners.claim(OLD_CHAT_ID, 2)
+
+    async def test_keeps_chat_when_promoted(self):
+        with patch("lmbatbot.cleanup.purge_chat") as purge:
+            await my_chat_member_handler(self._member_update(ChatMember.ADMINISTRATOR), MagicMock())
+        purge.assert_not_called()
+
+    async def test_keeps_chat_used_by_another_bot(self):
+        context = MagicMock()
+        context.bot.id = 1
+        other_bot = MagicMock()
+        other_bot.id = 2
+        other_bot.get_chat_member = AsyncMock(return_value=MagicMock(status=ChatMember.MEMBER))
+        with (
+            patch("lmbatbot.cleanup.hosted_bots", [context.bot, other_bot]),
+            patch("lmbatbot.cleanup.purge_chat") as purge,
+        ):
+            await my_chat_member_handler(self._member_update(ChatMember.BANNED), context)
+        purge.assert_not_called()
+
+    async def test_migrates_from_old_chat_only(self):
+        update = MagicMock()
+        update.effective_message.chat_id = OLD_CHAT_ID
+        update.effective_message.migrate_to_chat_id = NEW_CHAT_ID
+        with patch("lmbatbot.cleanup.migrate_chat", return_value=0) as migrate:
+            await migrate_handler(update, MagicMock())
+            update.effective_message.migrate_to_chat_id = None
+            await migrate_handler(update, MagicMock())
+        migrate.assert_called_once_with(OLD_CHAT_ID, NEW_CHAT_ID)
+
+
+# ---------------------------------------------------------------------------
+# Incremental vacuum
+# ---------------------------------------------------------------------------
+
+
+class TestIncrementalVacuum:
+    def test_frees_deleted_pages(self, tmp_path: Path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite3'}")
+        Base.metadata.create_all(engine)
+        session_factory = sessionmaker(engine)
+        with session_factory.begin() as s:
+            s.add_all(TagGroup(chat_id=i, group_name="#team", tags=["@a" * 100]) for i in range(1000))
+
+        with session_factory.begin() as s:
+            s.execute(delete(TagGroup))
+        # Not in the INCREMENTAL mode yet, the job must not fall back to a full VACUUM
+        assert incremental_vacuum(engine) == 0
+
+        enable_incremental_vacuum(engine)
+        with session_factory.begin() as s:
+            s.add_all(TagGroup(chat_id=i, group_name="#team", tags=["@a" * 100]) for i in range(1000))
+        with session_factory.begin() as s:
+            s.execute(delete(TagGroup))
+
+        assert incremental_vacuum(engine) > 0
+        assert incremental_vacuum(engine) == 0
@@ -0,0 +1,143 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sqlalchemy.orm import sessionmaker
+
+from lmbatbot.database.models import DigestSubscriber, PendingMention
+from lmbatbot.digest import (
+    MAX_DIGEST_LINES,
+    Mention,
+    MentionDigests,
+    deliver_job,
+    digest_command_handler,
+    render_digest,
+)
+from lmbatbot.tags import _send_private_mentions
+
+BOT_ID = 1
+USER_ID = 42
+
+# ---------------------------------------------------------------------------
+# MentionDigests
+# ---------------------------------------------------------------------------
+
+
+class TestMentionDigests:
+    def test_take_returns_only_mentions_of_the_bot(self):
+        digests = MentionDigests()
+        digests.add(BOT_ID, USER_ID, Mention("Chat", "@alice", None))
+        digests.add(2, USER_ID, Mention("Other", "@bob", None))
+        assert digests.take(BOT_ID) == {USER_ID: [Mention("Chat", "@alice", None)]}
+        assert digests.take(BOT_ID) == {}
+        assert digests.take(2) == {USER_ID: [Mention("Other", "@bob", None)]}
+
+    def test_persist_and_load_roundtrip(self, session_factory: sessionmaker):
+        mention = Mention("Chat", "@alice", "https://t.me/chat/1")
+        with patch("lmbatbot.digest.Session", session_factory):
+            digests = MentionDigests()
+            digests.subscribe(USER_ID, enabled=True)
+            digests.add(BOT_ID, USER_ID, mention)
+            digests.persist()
+
+            restored = MentionDigests()
+            restored.load()
+
+        assert restored.subscribers == {USER_ID}
+        assert restored.take(BOT_ID) == {USER_ID: [mention]}
+        with session_factory() as s:
+            assert s.query(PendingMention).count() == 0
+
+    def test_unsubscribe(self, session_factory: sessionmaker):
+        with patch("lmbatbot.digest.Session", session_factory):
+            digests = MentionDigests()
+            digests.subscribe(USER_ID, enabled=True)
+            digests.subscribe(USER_ID, enabled=False)
+        assert digests.subscribers == set()
+        with session_factory() as s:
+            assert s.query(DigestSubscriber).count() == 0
+
+
+# ---------------------------------------------------------------------------
+# Delivery
+# ---------------------------------------------------------------------------
+
+
+class TestDelivery:
+    def test_render_digest_escapes_and_links(self):
+        text = render_digest([Mention("<Chat>", "@alice", "https://t.me/chat/1"), Mention("Chat", "@bob", None)])
+        assert "2 times" in text
+        assert "&lt;Chat&gt;" in text
+        assert '<a href="https://t.me/chat/1">message</a>' in text
+
+    def test_render_digest_truncates(self):
+        text = render_digest([Mention("Chat", "@alice", None)] * (MAX_DIGEST_LINES + 5))
+        assert "and 5 more" in text
+
+    async def test_deliver_job_sends_one_message_per_user(self):
+        digests = MentionDigests()
+        digests.add(BOT_ID, USER_ID, Mention("Chat", "@alice", None))
+        digests.add(BOT_ID, USER_ID, Mention("Chat", "@bob", None))
+        context = MagicMock()
+        context.bot.id = BOT_ID
+        context.bot.send_message = AsyncMock()
+        with patch("lmbatbot.digest.mention_digests", digests):
+            await deliver_job(context)
+        context.bot.send_message.assert_awaited_once()
+        assert context.bot.send_message.call_args[0][0] == USER_ID
+
+    async def test_subscribers_get_mentions_buffered(self):
+        digests = MentionDigests()
+        digests.subscribers.add(USER_ID)
+        message = MagicMock()
+        message.from_user.username = "sender"
+        message.from_user.name = "@sender"
+        message.chat.effective_name = "Chat"
+        message.link = "https://t.me/chat/1"
+        message.get_bot.return_value.id = BOT_ID
+        message.reply_html = AsyncMock()
+        with (
+            patch("lmbatbot.tags.mention_digests", digests),
+            patch("lmbatbot.tags.settings") as mock_settings,
+        ):
+            mock_settings.GLOBAL_PVT_NOTIFICATION_USERS = [("@alice", USER_ID), ("@bob", 43)]
+            await _send_private_mentions(message, {"@alice", "@bob"})
+
+        assert digests.take(BOT_ID) == {USER_ID: [Mention("Chat", "@sender", "https://t.me/chat/1")]}
+        message.reply_html.assert_awaited_once()
+
+
+# ---------------------------------------------------------------------------
+# digest_command_handler
+# ---------------------------------------------------------------------------
+
+
+class TestDigestCommandHandler:
+    def _update(self, user_id: int) -> MagicMock:
+        update = MagicMock()
+        update.effective_user.id = user_id
+        update.effective_chat.send_message = AsyncMock()
+        return update
+
+    async def test_subscribes_notified_user(self, session_factory: sessionmaker):
+        digests = MentionDigests()
+        update = self._update(1)
+        with (
+            patch("lmbatbot.digest.Session", session_factory),
+            patch("lmbatbot.digest.mention_digests", digests),
+            patch("lmbatbot.digest.settings") as mock_settings,
+        ):
+            mock_settings.GLOBAL_PVT_NOTIFICATION_USERS = [("alice", 1)]
+            await digest_command_handler(update, MagicMock(args=["on"]))
+        assert digests.subscribers == {1}
+
+    async def test_unavailable_for_users_without_private_mentions(self, session_factory: sessionmaker):
+        digests = MentionDigests()
+        update = self._update(2)
+        with (
+            patch("lmbatbot.digest.Session", session_factory),
+            patch("lmbatbot.digest.mention_digests", digests),
+            patch("lmbatbot.digest.settings") as mock_settings,
+        ):
+            mock_settings.GLOBAL_PVT_NOTIFICATION_USERS = [("alice", 1)]
+            await digest_command_handler(update, MagicMock(args=["on"]))
+        assert not digests.subscribers
+        assert "unavailable" in update.effective_chat.send_message.call_args[0][0]
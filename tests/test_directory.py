@@ -0,0 +1,114 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from lmbatbot.database.models import User
+from lmbatbot.directory import (
+    UserDirectory,
+    parse_user_id_tag,
+    render_mentions,
+    render_names,
+    resolve_tags,
+    user_id_tag,
+)
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+
+def _make_user(user_id: int, username: str | None, full_name: str = "Full Name") -> MagicMock:
+    user = MagicMock()
+    user.id = user_id
+    user.username = username
+    user.full_name = full_name
+    user.is_bot = False
+    return user
+
+
+# ---------------------------------------------------------------------------
+# UserDirectory
+# ---------------------------------------------------------------------------
+
+
+class TestUserDirectory:
+    def test_flush_writes_pending_users_once(self, session_factory: sessionmaker):
+        directory = UserDirectory()
+        directory.observe(_make_user(1, "Alice"))
+        directory.observe(_make_user(1, "Alice"))
+        directory.observe(_make_user(2, None, "Bob"))
+        with patch("lmbatbot.directory.Session", session_factory):
+            assert directory.flush() == 2  # noqa: PLR2004
+            assert directory.flush() == 0
+
+        with session_factory() as s:
+            users = {u.user_id: (u.username, u.display_name) for u in s.query(User)}
+        assert users == {1: ("alice", "Full Name"), 2: (None, "Bob")}
+
+    def test_unchanged_user_is_not_written_again(self, session_factory: sessionmaker):
+        directory = UserDirectory()
+        with patch("lmbatbot.directory.Session", session_factory):
+            directory.observe(_make_user(1, "alice"))
+            directory.flush()
+            directory.observe(_make_user(1, "alice"))
+            assert directory.flush() == 0
+            directory.observe(_make_user(1, "alice_renamed"))
+            assert directory.flush() == 1
+
+    def test_failed_flush_keeps_the_observations(self, session_factory: sessionmaker):
+        directory = UserDirectory()
+        directory.observe(_make_user(1, "alice"))
+        with patch("lmbatbot.directory.Session.begin", side_effect=RuntimeError), pytest.raises(RuntimeError):
+            directory.flush()
+
+        with patch("lmbatbot.directory.Session", session_factory):
+            assert directory.flush() == 1
+        with session_factory() as s:
+            assert [u.username for u in s.query(User)] == ["alice"]
+
+    def test_bots_are_ignored(self, session_factory: sessionmaker):
+        directory = UserDirectory()
+        bot = _make_user(1, "a_bot")
+        bot.is_bot = True
+        directory.observe(bot)
+        with patch("lmbatbot.directory.Session", session_factory):
+            assert directory.flush() == 0
+
+    def test_lookup_and_resolve_include_pending_users(self, session_factory: sessionmaker):
+        directory = UserDirectory()
+        with patch("lmbatbot.directory.Session", session_factory):
+            directory.observe(_make_user(1, "alice"))
+            directory.flush()
+            directory.observe(_make_user(2, "bob"))
+
+            assert set(directory.lookup({1, 2, 3})) == {1, 2}
+            assert directory.resolve_usernames({"alice", "bob", "carol"}) == {"alice": 1, "bob": 2}
+
+
+# ---------------------------------------------------------------------------
+# Tags
+# ---------------------------------------------------------------------------
+
+
+class TestTags:
+    def test_user_id_tag_roundtrip(self):
+        assert parse_user_id_tag(user_id_tag(42)) == 42  # noqa: PLR2004
+        assert parse_user_id_tag("@alice") is None
+        assert parse_user_id_tag("tg://user?id=nope") is None
+
+    def test_resolve_and_render(self, session_factory: sessionmaker):
+        directory = UserDirectory()
+        directory.observe(_make_user(1, "alice"))
+        directory.observe(_make_user(2, None, "<Bob> & co"))
+        with (
+            patch("lmbatbot.directory.Session", session_factory),
+            patch("lmbatbot.directory.user_directory", directory),
+        ):
+            tags = resolve_tags(["@alice", "@carol", user_id_tag(2)])
+            assert tags == [user_id_tag(1), "@carol", user_id_tag(2)]
+
+            # alice changed username after being added
+            directory.observe(_make_user(1, "alice2"))
+            assert render_mentions(tags) == ["@alice2", "@carol", '<a href="tg://user?id=2">&lt;Bob&gt; &amp; co</a>']
+            assert render_names(tags) == ["alice2", "carol", "&lt;Bob&gt; &amp; co"]
@@ -0,0 +1,139 @@
+import asyncio
+import datetime as dt
+
+import pytest
+from pydantic import ValidationError
+from telegram import Chat, Message, MessageEntity, Update
+
+from lmbatbot.intake import IntakeQueue, Priority, SheddingPolicy, update_classifier
+from lmbatbot.settings import Settings
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+
+def _make_update(update_id: int, text: str, entities: tuple[MessageEntity, ...] = ()) -> Update:
+    message = Message(
+        message_id=update_id,
+        date=dt.datetime.now(dt.UTC),
+        chat=Chat(id=100, type=Chat.SUPERGROUP),
+        text=text,
+        entities=entities,
+    )
+    return Update(update_id=update_id, message=message)
+
+
+def _command(update_id: int, command: str) -> Update:
+    return _make_update(update_id, f"/{command}")
+
+
+classify = update_classifier(high_commands={"tagadd"}, low_commands={"bocchi"})
+
+
+def _queue(maxsize: int = 10, high_water: int = 2, policy: SheddingPolicy = SheddingPolicy.DROP_NEW) -> IntakeQueue:
+    return IntakeQueue(classify, maxsize=maxsize, high_water=high_water, policy=policy)
+
+
+def _drain(queue: IntakeQueue) -> list[int]:
+    ids: list[int] = []
+    while not queue.empty():
+        update = queue.get_nowait()
+        queue.task_done()
+        assert isinstance(update, Update)
+        ids.append(update.update_id)
+    return ids
+
+
+# ---------------------------------------------------------------------------
+# update_classifier
+# ---------------------------------------------------------------------------
+
+
+class TestUpdateClassifier:
+    def test_commands(self):
+        assert classify(_command(1, "tagadd")) == Priority.HIGH
+        assert classify(_command(1, "tagadd@lmbatbot")) == Priority.HIGH
+        assert classify(_command(1, "bocchi")) == Priority.LOW
+        assert classify(_command(1, "unknown")) == Priority.NORMAL
+
+    def test_hashtag_is_high_priority(self):
+        update = _make_update(1, "#team", (MessageEntity(MessageEntity.HASHTAG, offset=0, length=5),))
+        assert classify(update) == Priority.HIGH
+
+    def test_plain_message_is_normal_priority(self):
+        assert classify(_make_update(1, "hello")) == Priority.NORMAL
+
+
+# ---------------------------------------------------------------------------
+# IntakeQueue
+# ---------------------------------------------------------------------------
+
+
+class TestIntakeQueue:
+    async def test_high_priority_is_delivered_first(self):
+        queue = _queue()
+        await queue.put(_command(1, "bocchi"))
+        await queue.put(_make_update(2, "hello"))
+        await queue.put(_command(3, "tagadd"))
+        await queue.put(_command(4, "tagadd"))
+        assert _drain(queue) == [3, 4, 2, 1]
+
+    async def test_low_priority_is_shed_past_high_water(self):
+        queue = _queue(high_water=2)
+        for update_id in range(1, 5):
+            await queue.put(_command(update_id, "bocchi"))
+        await queue.put(_command(5, "tagadd"))
+        assert _drain(queue) == [5, 1, 2]
+        assert queue.dropped == {Priority.LOW: 2}
+
+    async def test_drop_oldest_policy_keeps_newest_low_priority(self):
+        queue = _queue(high_water=2, policy=SheddingPolicy.DROP_OLDEST)
+        for update_id in range(1, 5):
+            await queue.put(_command(update_id, "bocchi"))
+        assert _drain(queue) == [3, 4]
+        assert queue.dropped == {Priority.LOW: 2}
+
+    async def test_full_queue_sheds_low_priority_for_high_priority(self):
+        queue = _queue(maxsize=2, high_water=2)
+        await queue.put(_command(1, "bocchi"))
+        await queue.put(_make_update(2, "hello"))
+        await queue.put(_command(3, "tagadd"))
+        assert _drain(queue) == [3, 2]
+        assert queue.dropped == {Priority.LOW: 1}
+
+    async def test_full_queue_sheds_low_priority_without_waiting(self):
+        queue = _queue(maxsize=2, high_water=2)
+        await queue.put(_command(1, "tagadd"))
+        await queue.put(_command(2, "tagadd"))
+        await asyncio.wait_for(queue.put(_command(3, "bocchi")), timeout=1)
+        assert _drain(queue) == [1, 2]
+        assert queue.dropped == {Priority.LOW: 1}
+
+    async def test_full_queue_drop_oldest_replaces_low_priority(self):
+        queue = _queue(maxsize=2, high_water=2, policy=SheddingPolicy.DROP_OLDEST)
+        await queue.put(_command(1, "bocchi"))
+        await queue.put(_command(2, "tagadd"))
+        await asyncio.wait_for(queue.put(_command(3, "bocchi")), timeout=1)
+        assert _drain(queue) == [2, 3]
+        assert queue.dropped == {Priority.LOW: 1}
+
+    async def test_internal_signals_are_never_shed(self):
+        queue = _queue(high_water=0)
+        signal = object()
+        await queue.put(signal)
+        assert queue.get_nowait() is signal
+
+
+# ---------------------------------------------------------------------------
+# Settings
+# ---------------------------------------------------------------------------
+
+
+class TestIntakeSettings:
+    def test_high_water_must_fit_in_the_queue(self):
+        with pytest.raises(ValidationError, match="INTAKE_HIGH_WATER"):
+            Settings(INTAKE_MAX_SIZE=10, INTAKE_HIGH_WATER=11)
+
+    def test_high_water_equal_to_max_size(self):
+        assert Settings(INTAKE_MAX_SIZE=10, INTAKE_HIGH_WATER=10).INTAKE_HIGH_WATER == 10  # noqa: PLR2004
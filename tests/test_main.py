@@ -0,0 +1,23 @@
+from unittest.mock import MagicMock, patch
+
+from lmbatbot.main import _flush_shared_state
+
+# ---------------------------------------------------------------------------
+# Shutdown
+# ---------------------------------------------------------------------------
+
+
+class TestFlushSharedState:
+    def test_failing_flush_does_not_skip_the_others(self):
+        store = MagicMock()
+        with (
+            patch("lmbatbot.main.directory.user_directory.flush", side_effect=RuntimeError),
+            patch("lmbatbot.main.stats.usage_counters.flush") as stats_flush,
+            patch("lmbatbot.main.digest.mention_digests.persist") as digest_persist,
+            patch("lmbatbot.main.snapshot_store", store),
+        ):
+            _flush_shared_state()
+
+        stats_flush.assert_called_once_with()
+        digest_persist.assert_called_once_with()
+        store.persist.assert_called_once_with()
@@ -0,0 +1,43 @@
+from unittest.mock import patch
+
+from lmbatbot.notification_log import NotificationLog, Notified
+
+KEY = (1, 100, 10)
+
+# ---------------------------------------------------------------------------
+# NotificationLog
+# ---------------------------------------------------------------------------
+
+
+class TestNotificationLog:
+    def test_unknown_message_has_no_notifications(self):
+        assert NotificationLog(ttl=60, max_messages=10).get(KEY) == Notified()
+
+    def test_record_merges_notifications(self):
+        log = NotificationLog(ttl=60, max_messages=10)
+        log.record(KEY, Notified(group_names=frozenset({"#team"}), tags=frozenset({"@alice"})))
+        log.record(KEY, Notified(group_names=frozenset({"#ops"}), mentions=frozenset({"@bob"})))
+        assert log.get(KEY) == Notified(frozenset({"#team", "#ops"}), frozenset({"@alice"}), frozenset({"@bob"}))
+
+    def test_empty_notifications_are_not_stored(self):
+        log = NotificationLog(ttl=60, max_messages=10)
+        log.record(KEY, Notified())
+        assert len(log) == 0
+
+    def test_entries_expire(self):
+        log = NotificationLog(ttl=60, max_messages=10)
+        with patch("lmbatbot.notification_log.time.monotonic", return_value=0):
+            log.record(KEY, Notified(tags=frozenset({"@alice"})))
+        with patch("lmbatbot.notification_log.time.monotonic", return_value=59):
+            assert log.get(KEY).tags == {"@alice"}
+        with patch("lmbatbot.notification_log.time.monotonic", return_value=60):
+            assert log.get(KEY) == Notified()
+        assert len(log) == 0
+
+    def test_size_is_bounded(self):
+        log = NotificationLog(ttl=60, max_messages=10)
+        for message_id in range(100):
+            log.record((1, 100, message_id), Notified(tags=frozenset({"@alice"})))
+        assert len(log) == 10  # noqa: PLR2004
+        assert log.get((1, 100, 0)) == Notified()
+        assert log.get((1, 100, 99)).tags == {"@alice"}
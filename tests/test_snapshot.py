@@ -0,0 +1,99 @@
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+from pydantic import ValidationError
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from lmbatbot.database.models import Base, TagGroup
+from lmbatbot.settings import Settings
+from lmbatbot.snapshot import SnapshotStore, StorageMode, persist_job
+
+
+def _file_group_names(path: Path) -> set[str]:
+    with closing(sqlite3.connect(path)) as conn:
+        return {row[0] for row in conn.execute("SELECT group_name FROM tag_groups")}
+
+
+@pytest.fixture
+def db_path(tmp_path: Path) -> Path:
+    path = tmp_path / "db.sqlite3"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with sessionmaker(engine).begin() as s:
+        s.add(TagGroup(chat_id=1, group_name="#team", tags=["@a"]))
+    engine.dispose()
+    return path
+
+
+def _memory_session_factory(store: SnapshotStore) -> sessionmaker:
+    session_factory = sessionmaker(create_engine("sqlite://", creator=store.connect, poolclass=StaticPool))
+    event.listen(session_factory, "after_commit", store.after_commit)
+    return session_factory
+
+
+# ---------------------------------------------------------------------------
+# SnapshotStore
+# ---------------------------------------------------------------------------
+
+
+class TestSnapshotStore:
+    def test_loads_file_in_memory(self, db_path: Path):
+        session_factory = _memory_session_factory(SnapshotStore(str(db_path), change_threshold=100))
+        with session_factory() as s:
+            assert [g.group_name for g in s.query(TagGroup)] == ["#team"]
+
+    def test_persist_writes_changes_to_file(self, db_path: Path):
+        store = SnapshotStore(str(db_path), change_threshold=100)
+        session_factory = _memory_session_factory(store)
+        with session_factory.begin() as s:
+            s.add(TagGroup(chat_id=1, group_name="#ops", tags=["@b"]))
+
+        assert _file_group_names(db_path) == {"#team"}
+        assert store.pending_changes == 1
+        assert store.persist()
+        assert _file_group_names(db_path) == {"#team", "#ops"}
+        assert store.pending_changes == 0
+        assert not store.persist()
+
+    def test_persists_on_change_threshold(self, db_path: Path):
+        store = SnapshotStore(str(db_path), change_threshold=2)
+        session_factory = _memory_session_factory(store)
+        with session_factory.begin() as s:
+            s.add(TagGroup(chat_id=1, group_name="#ops", tags=["@b"]))
+        assert _file_group_names(db_path) == {"#team"}
+
+        with session_factory.begin() as s:
+            s.add(TagGroup(chat_id=1, group_name="#dev", tags=["@c"]))
+        assert _file_group_names(db_path) == {"#team", "#ops", "#dev"}
+
+    async def test_persist_job(self, db_path: Path):
+        store = SnapshotStore(str(db_path), change_threshold=100)
+        session_factory = _memory_session_factory(store)
+        with session_factory.begin() as s:
+            s.add(TagGroup(chat_id=1, group_name="#ops", tags=["@b"]))
+
+        await persist_job(MagicMock(job=MagicMock(data=store)))
+        assert _file_group_names(db_path) == {"#team", "#ops"}
+
+    def test_persist_before_connect_is_a_noop(self, db_path: Path):
+        assert not SnapshotStore(str(db_path), change_threshold=1).persist()
+
+
+# ---------------------------------------------------------------------------
+# Settings
+# ---------------------------------------------------------------------------
+
+
+class TestStorageModeSettings:
+    def test_memory_mode_requires_a_database_file(self):
+        with pytest.raises(ValidationError, match="SQLite database file"):
+            Settings(DB_STORAGE_MODE=StorageMode.MEMORY, DB_URL="sqlite://")
+
+    def test_memory_mode_with_a_database_file(self, db_path: Path):
+        settings = Settings(DB_STORAGE_MODE=StorageMode.MEMORY, DB_URL=f"sqlite:///{db_path}")
+        assert settings.DB_STORAGE_MODE == StorageMode.MEMORY
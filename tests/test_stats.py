@@ -0,0 +1,90 @@
+from datetime import date, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from lmbatbot.database.models import TagUsage
+from lmbatbot.stats import MAX_STATS_DAYS, UsageCounters, tagstats_command_handler
+from lmbatbot.tag_index import TagIndex
+
+# ---------------------------------------------------------------------------
+# UsageCounters
+# ---------------------------------------------------------------------------
+
+
+class TestUsageCounters:
+    def test_flush_adds_to_existing_aggregates(self, session_factory: sessionmaker):
+        counters = UsageCounters()
+        with patch("lmbatbot.stats.Session", session_factory):
+            counters.record(1, ["#team", "#ops"])
+            counters.record(1, ["#team"])
+            assert counters.flush() == 2  # noqa: PLR2004
+            counters.record(1, ["#team"])
+            assert counters.flush() == 1
+            assert counters.flush() == 0
+
+        with session_factory() as s:
+            usage = {u.group_name: u.count for u in s.query(TagUsage).filter_by(chat_id=1, day=date.today())}
+        assert usage == {"#team": 3, "#ops": 1}
+
+    def test_failed_flush_keeps_the_counters(self, session_factory: sessionmaker):
+        counters = UsageCounters()
+        counters.record(1, ["#team"])
+        with patch("lmbatbot.stats.Session.begin", side_effect=RuntimeError), pytest.raises(RuntimeError):
+            counters.flush()
+        assert counters.pending(1, date.today()) == {"#team": 1}
+
+        with patch("lmbatbot.stats.Session", session_factory):
+            assert counters.flush() == 1
+        assert not counters.pending(1, date.today())
+
+    def test_pending_filters_chat(self):
+        counters = UsageCounters()
+        counters.record(1, ["#team"])
+        counters.record(2, ["#team", "#ops"])
+        assert counters.pending(1, date.today()) == {"#team": 1}
+
+
+# ---------------------------------------------------------------------------
+# tagstats_command_handler
+# ---------------------------------------------------------------------------
+
+
+class TestTagstatsCommandHandler:
+    async def test_reports_flushed_and_pending_usage(self, session_factory: sessionmaker):
+        with session_factory.begin() as s:
+            s.add(TagUsage(chat_id=100, group_name="#team", day=date.today() - timedelta(days=1), count=4))
+            s.add(TagUsage(chat_id=100, group_name="#team", day=date.today() - timedelta(days=60), count=100))
+        counters = UsageCounters()
+        counters.record(100, ["#team", "#ops"])
+        index = TagIndex()
+        for group_name in ("#team", "#ops", "#idle"):
+            index.upsert(100, group_name, 1)
+
+        update = MagicMock()
+        update.effective_chat.id = 100
+        update.effective_chat.send_message = AsyncMock()
+        context = MagicMock()
+        context.args = []
+        with (
+            patch("lmbatbot.stats.Session", session_factory),
+            patch("lmbatbot.stats.usage_counters", counters),
+            patch("lmbatbot.stats.tag_index", index),
+        ):
+            await tagstats_command_handler(update, context)
+
+        sent = update.effective_chat.send_message.call_args[0][0]
+        assert "#team: 5" in sent
+        assert "#ops: 1" in sent
+        assert "<b>Unused groups:</b> #idle" in sent
+
+    @pytest.mark.parametrize(("arg", "days"), [("7", 7), ("0", 1), ("1000000", MAX_STATS_DAYS), ("²", 30), ("x", 30)])
+    async def test_days_argument_is_clamped(self, session_factory: sessionmaker, arg: str, days: int):
+        update = MagicMock()
+        update.effective_chat.id = 100
+        update.effective_chat.send_message = AsyncMock()
+        with patch("lmbatbot.stats.Session", session_factory):
+            await tagstats_command_handler(update, MagicMock(args=[arg]))
+
+        assert f"in the last {days} days" in update.effective_chat.send_message.call_args[0][0]
@@ -0,0 +1,111 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sqlalchemy.orm import sessionmaker
+
+from lmbatbot.database.models import TagGroup
+from lmbatbot.tag_index import MAX_RECENT_CHATS, TagIndex, load_tag_index, normalize_prefix
+from lmbatbot.tags import inline_query_handler, tagfind_command_handler
+
+# ---------------------------------------------------------------------------
+# TagIndex
+# ---------------------------------------------------------------------------
+
+
+class TestTagIndex:
+    def _index(self) -> TagIndex:
+        index = TagIndex()
+        index.load([(1, "#team", ["@a", "@b"]), (1, "#tea", ["@a"]), (1, "#other", ["@c"]), (2, "#team", ["@d"])])
+        return index
+
+    def test_search_returns_sorted_prefix_matches(self):
+        assert self._index().search(1, "#te") == [("#tea", 1), ("#team", 2)]
+
+    def test_search_is_isolated_per_chat(self):
+        assert self._index().search(2, "#te") == [("#team", 1)]
+
+    def test_search_normalizes_prefix(self):
+        assert self._index().search(1, " TEA") == self._index().search(1, "#tea")
+
+    def test_search_respects_limit(self):
+        assert self._index().search(1, "", limit=1) == [("#other", 1)]
+
+    def test_search_unknown_chat(self):
+        assert self._index().search(3, "#te") == []
+
+    def test_upsert_updates_member_count(self):
+        index = self._index()
+        index.upsert(1, "#tea", 5)
+        assert index.search(1, "#tea") == [("#tea", 5), ("#team", 2)]
+
+    def test_remove(self):
+        index = self._index()
+        index.remove(1, ["#tea", "#missing"])
+        assert index.search(1, "#te") == [("#team", 2)]
+
+    def test_recent_chats_are_bounded(self):
+        index = TagIndex()
+        for user_id in range(MAX_RECENT_CHATS + 1):
+            index.remember_chat(1, user_id, 1)
+        assert index.recent_chat(1, 0) is None
+        assert index.recent_chat(1, MAX_RECENT_CHATS) == 1
+
+    def test_recent_chats_are_namespaced_per_bot(self):
+        index = TagIndex()
+        index.remember_chat(1, 200, 100)
+        assert index.recent_chat(1, 200) == 100  # noqa: PLR2004
+        assert index.recent_chat(2, 200) is None
+
+    def test_normalize_prefix(self):
+        assert normalize_prefix("Team") == "#team"
+        assert normalize_prefix("#Team") == "#team"
+
+    def test_load_from_database(self, session_factory: sessionmaker):
+        with session_factory.begin() as s:
+            s.add(TagGroup(chat_id=1, group_name="#team", tags=["@a", "@b"]))
+        index = TagIndex()
+        with patch("lmbatbot.tag_index.Session", session_factory), patch("lmbatbot.tag_index.tag_index", index):
+            load_tag_index()
+        assert index.search(1, "#") == [("#team", 2)]
+
+
+# ---------------------------------------------------------------------------
+# Handlers
+# ---------------------------------------------------------------------------
+
+
+class TestHandlers:
+    async def test_tagfind_lists_matches(self):
+        index = TagIndex()
+        index.upsert(100, "#team", 2)
+        update = MagicMock()
+        update.effective_chat.id = 100
+        update.effective_chat.send_message = AsyncMock()
+        context = MagicMock()
+        context.args = ["te"]
+        with patch("lmbatbot.tags.tag_index", index):
+            await tagfind_command_handler(update, context)
+        sent = update.effective_chat.send_message.call_args[0][0]
+        assert "#team (2 members)" in sent
+
+    async def test_inline_query_answers_from_recent_chat(self):
+        index = TagIndex()
+        index.upsert(100, "#team", 2)
+        index.remember_chat(1, 200, 100)
+        update = MagicMock()
+        update.inline_query.from_user.id = 200
+        update.inline_query.query = "#t"
+        update.inline_query.answer = AsyncMock()
+        context = MagicMock()
+        context.bot.id = 1
+        with patch("lmbatbot.tags.tag_index", index):
+            await inline_query_handler(update, context)
+        [result] = update.inline_query.answer.call_args[0][0]
+        assert result.title == "#team"
+
+    async def test_inline_query_unknown_user_gets_no_results(self):
+        update = MagicMock()
+        update.inline_query.from_user.id = 200
+        update.inline_query.answer = AsyncMock()
+        with patch("lmbatbot.tags.tag_index", TagIndex()):
+            await inline_query_handler(update, MagicMock())
+        assert update.inline_query.answer.call_args[0][0] == []
@@ -1,18 +1,28 @@
+import datetime as dt
 from collections.abc import Sequence
+from datetime import date
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from sqlalchemy.orm import sessionmaker
-from telegram import MessageEntity
+from telegram import Chat, Message, MessageEntity, Update
 
+from lmbatbot.chat_owners import ChatOwners
 from lmbatbot.database.models import TagGroup
 from lmbatbot.database.types import UpsertResult
+from lmbatbot.directory import user_id_tag
+from lmbatbot.notification_log import NotificationLog
+from lmbatbot.stats import UsageCounters
+from lmbatbot.tag_index import TagIndex
 from lmbatbot.tags import (
     TagAddArgs,
     _collect_tags_for_groups,
     _parse_tagadd_command,
     _upsert_tag_group,
+    edited_message_handler,
+    handlers,
     hashtag_message_handler,
+    mention_message_handler,
     tagadd_command_handler,
     tagdel_command_handler,
     taglist_command_handler,
@@ -24,10 +34,16 @@ from lmbatbot.utils import CommandParsingError
 # ---------------------------------------------------------------------------
 
 
+@pytest.fixture(autouse=True)
+def chat_owners():
+    with patch("lmbatbot.tags.chat_owners", ChatOwners()) as owners:
+        yield owners
+
+
 def _make_message(
     hashtags: Sequence[str] = (),
     mentions: Sequence[str] = (),
-    text_mentions: Sequence[str] = (),
+    text_mentions: Sequence[tuple[str, int]] = (),
     from_username: str | None = "sender",
     from_name: str = "@sender",
     chat_name: str = "Test Chat",
@@ -43,7 +59,7 @@ def _make_message(
     entity_data = {
         MessageEntity.HASHTAG: {MagicMock(): h for h in hashtags},
         MessageEntity.MENTION: {MagicMock(): m for m in mentions},
-        MessageEntity.TEXT_MENTION: {MagicMock(): t for t in text_mentions},
+        MessageEntity.TEXT_MENTION: {MagicMock(user=MagicMock(id=user_id)): t for t, user_id in text_mentions},
     }
 
     def _parse_entities(types: list[str]) -> dict:
@@ -115,10 +131,15 @@ class TestParseTagaddCommand:
         with pytest.raises(CommandParsingError, match="No mentions found"):
             _parse_tagadd_command(msg)
 
-    def test_text_mention_raises(self):
-        msg = _make_message(hashtags=["#team"], mentions=["@alice"], text_mentions=["Bob"])
-        with pytest.raises(CommandParsingError, match="TEXT_MENTION are not supported"):
-            _parse_tagadd_command(msg)
+    def test_text_mention_is_stored_by_user_id(self):
+        msg = _make_message(hashtags=["#team"], mentions=["@alice"], text_mentions=[("Bob", 42)])
+        result = _parse_tagadd_command(msg)
+        assert set(result.tags) == {"@alice", user_id_tag(42)}
+
+    def test_only_text_mentions(self):
+        msg = _make_message(hashtags=["#team"], text_mentions=[("Bob", 42)])
+        result = _parse_tagadd_command(msg)
+        assert result.tags == [user_id_tag(42)]
 
 
 # ---------------------------------------------------------------------------
@@ -217,21 +238,36 @@ class TestTagaddCommandHandler:
     async def test_adds_new_group(self, session_factory: sessionmaker):
         msg = _make_message(hashtags=["#team"], mentions=["@alice"])
         update = _make_update(chat_id=100, message=msg)
-        with patch("lmbatbot.tags.Session", session_factory):
+        index = TagIndex()
+        with (
+            patch("lmbatbot.tags.Session", session_factory),
+            patch("lmbatbot.directory.Session", session_factory),
+            patch("lmbatbot.tags.tag_index", index),
+        ):
             await tagadd_command_handler(update, MagicMock())
         update.effective_chat.send_message.assert_awaited_once()
         sent = update.effective_chat.send_message.call_args[0][0]
         assert "added" in sent.lower()
+        assert index.contains(100, "#team")
+        assert index.search(100, "te") == [("#team", 1)]
 
     async def test_updates_existing_group(self, session_factory: sessionmaker):
         with session_factory.begin() as s:
             s.add(TagGroup(chat_id=100, group_name="#team", tags=["@alice"]))
         msg = _make_message(hashtags=["#team"], mentions=["@bob"])
         update = _make_update(chat_id=100, message=msg)
-        with patch("lmbatbot.tags.Session", session_factory):
+        index = TagIndex()
+        index.upsert(100, "#team", 5)
+        with (
+            patch("lmbatbot.tags.Session", session_factory),
+            patch("lmbatbot.directory.Session", session_factory),
+            patch("lmbatbot.tags.tag_index", index),
+        ):
             await tagadd_command_handler(update, MagicMock())
         sent = update.effective_chat.send_message.call_args[0][0]
         assert "updated" in sent.lower()
+        # The members of the group are replaced
+        assert index.search(100, "te") == [("#team", 1)]
 
     async def test_invalid_format_replies_with_error(self, session_factory: sessionmaker):
         msg = _make_message(hashtags=[], mentions=["@alice"])
@@ -253,7 +289,9 @@ class TestTagdelCommandHandler:
             s.add(TagGroup(chat_id=100, group_name="#team", tags=["@alice"]))
         msg = _make_message(hashtags=["#team"])
         update = _make_update(chat_id=100, message=msg)
-        with patch("lmbatbot.tags.Session", session_factory):
+        index = TagIndex()
+        index.upsert(100, "#team", 1)
+        with patch("lmbatbot.tags.Session", session_factory), patch("lmbatbot.tags.tag_index", index):
             await tagdel_command_handler(update, MagicMock())
         sent = update.effective_chat.send_message.call_args[0][0]
         assert "#team" in sent
@@ -261,6 +299,8 @@ class TestTagdelCommandHandler:
         with session_factory() as s:
             remaining = s.query(TagGroup).filter_by(chat_id=100, group_name="#team").first()
         assert remaining is None
+        assert not index.contains(100, "#team")
+        assert index.search(100, "te") == []
 
     async def test_missing_hashtag_replies_with_error(self):
         msg = _make_message(hashtags=[])
@@ -316,3 +356,129 @@ class TestHashtagMessageHandler:
             mock_settings.GLOBAL_PVT_NOTIFICATION_USERS = []
             await hashtag_message_handler(update, MagicMock())
         msg.reply_html.assert_not_awaited()
+
+
+# ---------------------------------------------------------------------------
+# edited_message_handler
+# ---------------------------------------------------------------------------
+
+
+class TestEditedMessageHandler:
+    def _context(self) -> MagicMock:
+        context = MagicMock()
+        context.bot.id = 1
+        return context
+
+    def _message(self, hashtags: Sequence[str] = (), mentions: Sequence[str] = ()) -> MagicMock:
+        msg = _make_message(hashtags=hashtags, mentions=mentions, from_username="carol")
+        msg.message_id = 10
+        return msg
+
+    async def test_notifies_only_added_members(self, session_factory: sessionmaker):
+        with session_factory.begin() as s:
+            s.add(TagGroup(chat_id=100, group_name="#team", tags=["@alice", "@bob"]))
+            s.add(TagGroup(chat_id=100, group_name="#ops", tags=["@bob", "@dave"]))
+        context = self._context()
+        original = self._message(hashtags=["#team"])
+        edited = self._message(hashtags=["#team", "#ops"])
+        with (
+            patch("lmbatbot.tags.Session", session_factory),
+            patch("lmbatbot.tags.notification_log", NotificationLog(ttl=60, max_messages=10)),
+            patch("lmbatbot.tags.settings") as mock_settings,
+        ):
+            mock_settings.GLOBAL_PVT_NOTIFICATION_USERS = []
+            await hashtag_message_handler(_make_update(chat_id=100, username="carol", message=original), context)
+            await edited_message_handler(_make_update(chat_id=100, username="carol", message=edited), context)
+
+        assert edited.reply_html.call_args[0][0] == "@dave"
+
+    async def test_unchanged_edit_notifies_nobody(self, session_factory: sessionmaker):
+        with session_factory.begin() as s:
+            s.add(TagGroup(chat_id=100, group_name="#team", tags=["@alice"]))
+        context = self._context()
+        edited = self._message(hashtags=["#team"], mentions=["@alice"])
+        with (
+            patch("lmbatbot.tags.Session", session_factory),
+            patch("lmbatbot.tags.notification_log", NotificationLog(ttl=60, max_messages=10)),
+            patch("lmbatbot.tags.settings") as mock_settings,
+        ):
+            mock_settings.GLOBAL_PVT_NOTIFICATION_USERS = [("@alice", 42)]
+            original = self._message(hashtags=["#team"])
+            await hashtag_message_handler(_make_update(chat_id=100, username="carol", message=original), context)
+            original.reply_html.assert_awaited()
+            await edited_message_handler(_make_update(chat_id=100, username="carol", message=edited), context)
+
+        edited.reply_html.assert_not_awaited()
+
+    async def test_edit_adding_a_mention_notifies_privately(self, session_factory: sessionmaker):
+        context = self._context()
+        edited = self._message(mentions=["@alice"])
+        with (
+            patch("lmbatbot.tags.Session", session_factory),
+            patch("lmbatbot.tags.notification_log", NotificationLog(ttl=60, max_messages=10)),
+            patch("lmbatbot.tags.settings") as mock_settings,
+        ):
+            mock_settings.GLOBAL_PVT_NOTIFICATION_USERS = [("@alice", 42)]
+            await edited_message_handler(_make_update(chat_id=100, username="carol", message=edited), context)
+
+        edited.reply_html.assert_awaited_once()
+        assert "mentioned" in edited.reply_html.call_args[0][0]
+
+    @pytest.mark.parametrize("edited", [False, True])
+    def test_edits_are_only_handled_by_the_edit_handler(self, *, edited: bool):
+        message = Message(
+            message_id=10,
+            date=dt.datetime.now(dt.UTC),
+            chat=Chat(id=100, type=Chat.SUPERGROUP),
+            text="#team @alice",
+            entities=(MessageEntity(MessageEntity.HASHTAG, 0, 5), MessageEntity(MessageEntity.MENTION, 6, 6)),
+        )
+        update = Update(update_id=1, edited_message=message) if edited else Update(update_id=1, message=message)
+        matching = [handler.callback for handler in handlers() if handler.check_update(update)]
+        assert matching == ([edited_message_handler] if edited else [hashtag_message_handler, mention_message_handler])
+
+
+# ---------------------------------------------------------------------------
+# Several hosted bots in the same chat
+# ---------------------------------------------------------------------------
+
+
+class TestChatOwners:
+    async def test_only_the_owner_bot_notifies(self, session_factory: sessionmaker):
+        with session_factory.begin() as s:
+            s.add(TagGroup(chat_id=100, group_name="#team", tags=["@alice"]))
+        first_bot, second_bot = MagicMock(), MagicMock()
+        first_bot.bot.id = 1
+        second_bot.bot.id = 2
+        msg = _make_message(hashtags=["#team"], from_username="carol")
+        counters = UsageCounters()
+        index = TagIndex()
+        index.upsert(100, "#team", 5)
+        with (
+            patch("lmbatbot.tags.Session", session_factory),
+            patch("lmbatbot.tags.usage_counters", counters),
+            patch("lmbatbot.tags.tag_index", index),
+            patch("lmbatbot.tags.settings") as mock_settings,
+        ):
+            mock_settings.GLOBAL_PVT_NOTIFICATION_USERS = []
+            await hashtag_message_handler(_make_update(chat_id=100, username="carol", message=msg), first_bot)
+            await hashtag_message_handler(_make_update(chat_id=100, username="carol", message=msg), second_bot)
+
+        msg.reply_html.assert_awaited_once()
+        assert counters.pending(100, date.min) == {"#team": 1}
+
+    async def test_private_chats_are_not_claimed(self, session_factory: sessionmaker, chat_owners: ChatOwners):
+        update = _make_update(chat_id=200, message=_make_message(hashtags=["#team"]))
+        update.effective_chat.type = Chat.PRIVATE
+        with patch("lmbatbot.tags.Session", session_factory):
+            await hashtag_message_handler(update, MagicMock())
+        assert chat_owners.claim(200, 42)
+
+    def test_release_hands_the_chat_to_another_bot(self):
+        owners = ChatOwners()
+        assert owners.claim(100, 1)
+        assert not owners.claim(100, 2)
+        owners.release(100, 2)
+        assert not owners.claim(100, 2)
+        owners.release(100, 1)
+        assert owners.claim(100, 2)
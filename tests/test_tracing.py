@@ -0,0 +1,109 @@
+import json
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from lmbatbot import tracing
+
+UPDATE_ID = 42
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+
+@pytest.fixture
+def export_path(tmp_path: Path) -> Iterator[Path]:
+    yield tmp_path / "traces.jsonl"
+    tracing.setup_tracing(None, sample_rate=0, slow_threshold_ms=0, max_bytes=0, backup_count=0)
+
+
+def _setup(export_path: Path, sample_rate: float, slow_threshold_ms: float = 60_000) -> None:
+    tracing.setup_tracing(
+        export_path,
+        sample_rate=sample_rate,
+        slow_threshold_ms=slow_threshold_ms,
+        max_bytes=1024 * 1024,
+        backup_count=1,
+    )
+
+
+def _exported(export_path: Path) -> list[dict]:
+    if not export_path.exists():
+        return []
+    return [json.loads(line) for line in export_path.read_text().splitlines()]
+
+
+# ---------------------------------------------------------------------------
+# trace_update
+# ---------------------------------------------------------------------------
+
+
+class TestTraceUpdate:
+    def test_sampled_trace_is_exported_with_spans(self, export_path: Path):
+        _setup(export_path, sample_rate=1)
+        with tracing.trace_update(UPDATE_ID), tracing.span("handler", chat_id=1):
+            pass
+
+        [trace] = _exported(export_path)
+        assert trace["update_id"] == UPDATE_ID
+        assert trace["sampled"] is True
+        assert [s["name"] for s in trace["spans"]] == ["handler"]
+        assert trace["spans"][0]["chat_id"] == 1
+
+    def test_unsampled_fast_trace_is_not_exported(self, export_path: Path):
+        _setup(export_path, sample_rate=0)
+        with tracing.trace_update(UPDATE_ID), tracing.span("handler"):
+            pass
+
+        assert _exported(export_path) == []
+
+    def test_unsampled_slow_trace_is_exported(self, export_path: Path):
+        _setup(export_path, sample_rate=0, slow_threshold_ms=0)
+        with tracing.trace_update(UPDATE_ID):
+            pass
+
+        [trace] = _exported(export_path)
+        assert trace["sampled"] is False
+
+    def test_disabled_tracing_records_nothing(self, export_path: Path):
+        with tracing.trace_update(UPDATE_ID) as trace:
+            assert trace is None
+        assert not export_path.exists()
+
+    def test_span_outside_trace_is_noop(self, export_path: Path):
+        _setup(export_path, sample_rate=1)
+        with tracing.span("orphan"):
+            pass
+        assert _exported(export_path) == []
+
+
+# ---------------------------------------------------------------------------
+# instrumentation
+# ---------------------------------------------------------------------------
+
+
+class TestInstrumentation:
+    async def test_traced_records_span_with_function_name(self, export_path: Path):
+        async def handler() -> int:
+            return 1
+
+        _setup(export_path, sample_rate=1)
+        with tracing.trace_update(1):
+            assert await tracing.traced(handler)() == 1
+
+        [trace] = _exported(export_path)
+        assert trace["spans"][0]["name"].endswith("handler")
+
+    def test_engine_statements_are_recorded(self, export_path: Path):
+        engine = create_engine("sqlite://")
+        tracing.instrument_engine(engine)
+
+        _setup(export_path, sample_rate=1)
+        with tracing.trace_update(1), engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+        [trace] = _exported(export_path)
+        assert [s["statement"] for s in trace["spans"] if s["name"] == "db"] == ["SELECT 1"]
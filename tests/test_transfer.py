@@ -0,0 +1,232 @@
+import io
+import json
+import re
+from datetime import UTC, datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+from telegram import Chat, Document, Message
+from telegram import Update as TelegramUpdate
+from telegram.ext import MessageHandler
+
+from lmbatbot.database.models import TagGroup
+from lmbatbot.tag_index import TagIndex
+from lmbatbot.tags import TagAddArgs
+from lmbatbot.transfer import (
+    MAX_IMPORT_SIZE,
+    export_tag_groups,
+    handlers,
+    import_tag_groups,
+    parse_csv,
+    parse_json,
+    tagexport_command_handler,
+    tagimport_caption_handler,
+    tagimport_command_handler,
+)
+from lmbatbot.utils import CommandParsingError
+
+# ---------------------------------------------------------------------------
+# Parsing
+# ---------------------------------------------------------------------------
+
+
+class TestParsing:
+    def test_parse_csv(self):
+        stream = io.StringIO("group_name,tags\n#Team,@Alice @bobby @alice\n")
+        assert list(parse_csv(stream)) == [TagAddArgs(group="#team", tags=["@alice", "@bobby"])]
+
+    def test_parse_csv_without_header(self):
+        assert list(parse_csv(io.StringIO("#team,@alice\n"))) == [TagAddArgs(group="#team", tags=["@alice"])]
+
+    def test_parse_csv_invalid_row_raises(self):
+        with pytest.raises(CommandParsingError, match="Line 2"):
+            list(parse_csv(io.StringIO("#team,@alice\n#broken\n")))
+
+    def test_parse_json(self):
+        stream = io.StringIO(json.dumps([{"group_name": "#team", "tags": ["@alice"]}]))
+        assert list(parse_json(stream)) == [TagAddArgs(group="#team", tags=["@alice"])]
+
+    def test_parse_json_invalid_group_raises(self):
+        stream = io.StringIO(json.dumps([{"group_name": "team", "tags": ["@alice"]}]))
+        with pytest.raises(CommandParsingError, match="Invalid group name"):
+            list(parse_json(stream))
+
+    @pytest.mark.parametrize(
+        ("group_name", "tag"),
+        [
+            ("#team name", "@alice"),
+            ("#<b>&", "@alice"),
+            ("#", "@alice"),
+            ("#team", "@"),
+            ("#team", "@c d"),
+            ("#team", "@bob\x00"),
+            ("#team", "@bob"),
+            ("#team", "<b>@alice</b>"),
+            ("#team", "tg://user?id= 12"),
+        ],
+    )
+    def test_parse_json_rejects_names_telegram_would_not_parse(self, group_name: str, tag: str):
+        stream = io.StringIO(json.dumps([{"group_name": group_name, "tags": [tag]}]))
+        with pytest.raises(CommandParsingError, match="Invalid"):
+            list(parse_json(stream))
+
+    @pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+    def test_parse_json_reads_in_chunks(self, chunk_size: int):
+        groups = [{"group_name": f"#group{i}", "tags": [f"@user{i}_x", "@alice"]} for i in range(20)]
+        stream = io.StringIO(" " + json.dumps(groups, indent=2) + "\n")
+        with patch("lmbatbot.transfer.JSON_CHUNK_SIZE", chunk_size):
+            parsed = list(parse_json(stream))
+        assert [group.group for group in parsed] == [f"#group{i}" for i in range(20)]
+
+    def test_parse_json_yields_before_reading_everything(self):
+        stream = io.StringIO(json.dumps([{"group_name": "#team", "tags": ["@alice"]}]) + " " * 100_000)
+        with patch("lmbatbot.transfer.JSON_CHUNK_SIZE", 16):
+            assert next(parse_json(stream)) == TagAddArgs(group="#team", tags=["@alice"])
+        assert stream.tell() < 100  # noqa: PLR2004
+
+    @pytest.mark.parametrize(
+        "document",
+        ["", "{}", "[", '[{"group_name": "#team", "tags": ["@alice"]}', "[] []", "[1 2]"],
+    )
+    def test_parse_json_malformed_document_raises(self, document: str):
+        with pytest.raises((CommandParsingError, json.JSONDecodeError)):
+            list(parse_json(io.StringIO(document)))
+
+    def test_parse_json_empty_list(self):
+        assert list(parse_json(io.StringIO(" [ ] "))) == []
+
+    def test_parse_json_accepts_user_id_tags(self):
+        stream = io.StringIO(json.dumps([{"group_name": "#Équipe_1", "tags": ["tg://user?id=42"]}]))
+        assert list(parse_json(stream)) == [TagAddArgs(group="#équipe_1", tags=["tg://user?id=42"])]
+
+
+# ---------------------------------------------------------------------------
+# Import and export
+# ---------------------------------------------------------------------------
+
+
+class TestImportExport:
+    def test_import_upserts_groups(self, session_factory: sessionmaker):
+        with session_factory.begin() as s:
+            s.add(TagGroup(chat_id=1, group_name="#team", tags=["@old"]))
+        groups = [TagAddArgs(group="#team", tags=["@alice"]), TagAddArgs(group="#ops", tags=["@bobby"])]
+        index = TagIndex()
+        with patch("lmbatbot.transfer.Session", session_factory), patch("lmbatbot.transfer.tag_index", index):
+            assert import_tag_groups(1, groups) == len(groups)
+
+        with session_factory() as s:
+            rows = {g.group_name: g.tags for g in s.query(TagGroup).filter_by(chat_id=1)}
+        assert rows == {"#team": ["@alice"], "#ops": ["@bobby"]}
+        assert index.search(1, "#") == [("#ops", 1), ("#team", 1)]
+
+    def test_import_is_atomic(self, session_factory: sessionmaker):
+        def groups():
+            yield TagAddArgs(group="#team", tags=["@alice"])
+            msg = "broken"
+            raise CommandParsingError(msg)
+
+        with patch("lmbatbot.transfer.Session", session_factory), pytest.raises(CommandParsingError):
+            import_tag_groups(1, groups())
+
+        with session_factory() as s:
+            assert s.query(TagGroup).count() == 0
+
+    @pytest.mark.parametrize(("fmt", "parse"), [("csv", parse_csv), ("json", parse_json)])
+    def test_export_roundtrip(self, session_factory: sessionmaker, fmt, parse):
+        with session_factory.begin() as s:
+            s.add(TagGroup(chat_id=1, group_name="#team", tags=["@alice", "@bobby"]))
+            s.add(TagGroup(chat_id=2, group_name="#other", tags=["@carol"]))
+        document = io.BytesIO()
+        with patch("lmbatbot.transfer.Session", session_factory):
+            export_tag_groups(1, fmt, document)
+        assert not document.closed
+        parsed = list(parse(io.StringIO(document.getvalue().decode())))
+        assert parsed == [TagAddArgs(group="#team", tags=["@alice", "@bobby"])]
+
+
+# ---------------------------------------------------------------------------
+# Handlers
+# ---------------------------------------------------------------------------
+
+
+class TestTagexportCommandHandler:
+    async def test_sends_exported_document(self, session_factory: sessionmaker):
+        with session_factory.begin() as s:
+            s.add(TagGroup(chat_id=100, group_name="#team", tags=["@alice"]))
+        sent: list[bytes] = []
+        update = MagicMock()
+        update.effective_chat.id = 100
+        update.effective_chat.send_document = AsyncMock(side_effect=lambda document, **_: sent.append(document.read()))
+        with patch("lmbatbot.transfer.Session", session_factory):
+            await tagexport_command_handler(update, MagicMock(args=[]))
+        assert sent == [b"group_name,tags\r\n#team,@alice\r\n"]
+        assert update.effective_chat.send_document.call_args.kwargs["filename"] == "tag_groups_100.csv"
+
+
+class TestTagimportCommandHandler:
+    def _update(self, document: MagicMock | None) -> MagicMock:
+        update = MagicMock()
+        update.effective_chat.id = 100
+        update.effective_chat.send_message = AsyncMock()
+        update.effective_message.reply_text = AsyncMock()
+        update.effective_message.document = document
+        update.effective_message.reply_to_message = None
+        return update
+
+    def _document(self, content: bytes) -> MagicMock:
+        document = MagicMock(file_name="groups.csv", mime_type="text/csv", file_size=len(content))
+        file = MagicMock(download_as_bytearray=AsyncMock(return_value=bytearray(content)))
+        document.get_file = AsyncMock(return_value=file)
+        return document
+
+    async def test_imports_csv_document(self, session_factory: sessionmaker):
+        update = self._update(self._document(b"#team,@alice\n"))
+        index = TagIndex()
+        with patch("lmbatbot.transfer.Session", session_factory), patch("lmbatbot.transfer.tag_index", index):
+            await tagimport_command_handler(update, MagicMock())
+        assert "1 groups imported" in update.effective_chat.send_message.call_args[0][0]
+        assert index.search(100, "te") == [("#team", 1)]
+
+    async def test_missing_document_replies_with_error(self):
+        update = self._update(None)
+        await tagimport_command_handler(update, MagicMock())
+        update.effective_message.reply_text.assert_awaited_once()
+        update.effective_chat.send_message.assert_not_awaited()
+
+    async def test_too_large_document_is_not_downloaded(self):
+        document = self._document(b"")
+        document.file_size = MAX_IMPORT_SIZE + 1
+        update = self._update(document)
+        await tagimport_command_handler(update, MagicMock())
+        assert "too large" in update.effective_message.reply_text.call_args[0][0]
+        document.get_file.assert_not_awaited()
+
+    async def test_oversized_csv_field_replies_with_error(self, session_factory: sessionmaker):
+        update = self._update(self._document(b'#team,"' + b"@alice " * 20_000 + b'"\n'))
+        with patch("lmbatbot.transfer.Session", session_factory):
+            await tagimport_command_handler(update, MagicMock())
+        assert "Import failed" in update.effective_message.reply_text.call_args[0][0]
+        update.effective_chat.send_message.assert_not_awaited()
+
+    @pytest.mark.parametrize(("caption", "imports"), [("/tagimport@LmbatBot", 1), ("/tagimport@other_bot", 0)])
+    async def test_caption_for_another_bot_is_ignored(self, session_factory: sessionmaker, caption: str, imports: int):
+        update = self._update(self._document(b"#team,@alice\n"))
+        context = MagicMock()
+        context.bot.username = "lmbatbot"
+        context.matches = [re.match(r"^/tagimport(?:@(?P<bot_username>\w+))?\b", caption)]
+        with patch("lmbatbot.transfer.Session", session_factory), patch("lmbatbot.transfer.tag_index", TagIndex()):
+            await tagimport_caption_handler(update, context)
+        assert update.effective_chat.send_message.await_count == imports
+
+    def test_edited_caption_is_not_imported(self):
+        (caption_handler,) = (h for h in handlers() if isinstance(h, MessageHandler))
+        message = Message(
+            1,
+            datetime.now(UTC),
+            Chat(100, Chat.GROUP),
+            document=Document("file_id", "file_unique_id"),
+            caption="/tagimport",
+        )
+        assert caption_handler.check_update(TelegramUpdate(1, message=message))
+        assert not caption_handler.check_update(TelegramUpdate(1, edited_message=message))